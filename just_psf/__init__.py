@@ -12,7 +12,6 @@ __email__ = 'pierre.beaujean@unamur.be'
 __status__ = 'Development'
 
 
-# logging
-logging.basicConfig(level=logging.WARNING)
+# logging (handlers are configured by the scripts)
 logger = logging.getLogger(__name__)
 logger.setLevel(os.environ.get('LOGLEVEL', 'WARNING').upper())
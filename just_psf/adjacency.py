@@ -0,0 +1,145 @@
+from typing import Tuple, Optional
+
+import numpy
+from numpy.typing import NDArray
+
+
+class Adjacency:
+    """Adjacency index of a (bond) graph, in compressed sparse row (CSR) format: the neighbors of atom `i` are
+    `indices[indptr[i]:indptr[i + 1]]`, sorted.
+    """
+
+    def __init__(self, indptr: NDArray[int], indices: NDArray[int]):
+        assert indptr.shape[0] > 0 and indptr[-1] == indices.shape[0]
+
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_bonds(cls, n: int, bonds: Optional[NDArray[int]]) -> 'Adjacency':
+        """Build the index for `n` atoms from a list of bonds (which are considered in both directions)
+        """
+
+        if bonds is None or bonds.shape[0] == 0:
+            return cls(numpy.zeros(n + 1, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64))
+
+        sources = numpy.concatenate([bonds[:, 0], bonds[:, 1]]).astype(numpy.int64)
+        targets = numpy.concatenate([bonds[:, 1], bonds[:, 0]]).astype(numpy.int64)
+
+        order = numpy.lexsort((targets, sources))
+
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(sources, minlength=n), out=indptr[1:])
+
+        return cls(indptr, targets[order])
+
+    @classmethod
+    def from_pairs(cls, n: int, pairs: NDArray[int]) -> 'Adjacency':
+        """Build a (half) index for `n` atoms from sorted pairs `(i, j)`, with `i < j` (e.g., exclusions), which are
+        only considered in that direction: the partners of `i` are the `j > i`.
+        """
+
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(pairs[:, 0], minlength=n), out=indptr[1:])
+
+        return cls(indptr, pairs[:, 1].astype(numpy.int64))
+
+    def __len__(self) -> int:
+        return self.indptr.shape[0] - 1
+
+    def neighbors(self, i: int) -> NDArray[int]:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def degrees(self) -> NDArray[int]:
+        return numpy.diff(self.indptr)
+
+    def expand(self, frontier: NDArray[int]) -> Tuple[NDArray[int], NDArray[int]]:
+        """Get all the neighbors of the atoms in `frontier`, as two arrays `(sources, neighbors)`, so that
+        `neighbors[k]` is bonded to `sources[k]`.
+        """
+
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+
+        sources = numpy.repeat(frontier, counts)
+        offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+
+        return sources, self.indices[numpy.repeat(starts, counts) + offsets]
+
+    def pairs(self, n: int) -> Tuple[NDArray[int], NDArray[int]]:
+        """Get all the pairs of atoms `(i, j)`, with `i < j`, at a bonded (topological) distance of at most `n`, as
+        two arrays `(pairs, distances)`. Pairs are sorted.
+
+        Walks of `n` bonds (without going back) are followed from every atom at once, and pairs are packed into
+        int64 keys, so that the shortest distance of each pair is found with `numpy.unique`.
+        """
+
+        size = len(self)
+        degrees = self.degrees()
+
+        starts = ends = numpy.arange(size, dtype=numpy.int64)
+        previous = numpy.full(size, -1, dtype=numpy.int64)
+
+        keys, distances = [], []
+        for level in range(1, n + 1):
+            counts = degrees[ends]
+            sources, nexts = self.expand(ends)
+
+            not_back = nexts != numpy.repeat(previous, counts)
+            starts, previous, ends = numpy.repeat(starts, counts)[not_back], sources[not_back], nexts[not_back]
+
+            is_half = starts < ends
+            keys.append(starts[is_half] * size + ends[is_half])
+            distances.append(numpy.full(keys[-1].shape[0], level, dtype=numpy.int64))
+
+        keys = numpy.concatenate(keys) if len(keys) > 0 else numpy.zeros(0, dtype=numpy.int64)
+        distances = numpy.concatenate(distances) if len(distances) > 0 else numpy.zeros(0, dtype=numpy.int64)
+
+        # the first occurrence of each key is the shortest
+        order = numpy.lexsort((distances, keys))
+        keys, first = numpy.unique(keys[order], return_index=True)
+
+        return numpy.stack([keys // size, keys % size], axis=1), distances[order][first]
+
+    def distances(self, i: int, max_distance: int = -1) -> NDArray[int]:
+        """Get the bonded (topological) distance from `i` to every atom (up to `max_distance` if positive),
+        -1 if not reachable.
+        """
+
+        distances = numpy.full(len(self), -1, dtype=numpy.int64)
+        distances[i] = 0
+
+        frontier = numpy.array([i])
+        level = 0
+        while frontier.shape[0] > 0 and (max_distance < 0 or level < max_distance):
+            level += 1
+            _, neighbors = self.expand(frontier)
+            frontier = numpy.unique(neighbors[distances[neighbors] < 0])
+            distances[frontier] = level
+
+        return distances
+
+    def within(self, i: int, n: int) -> NDArray[int]:
+        """Get the atoms at a bonded distance of at most `n` from `i` (excluding `i`), sorted."""
+
+        return numpy.flatnonzero(self.distances(i, n) > 0)
+
+    def connected_components(self) -> NDArray[int]:
+        """Get the label of the connected component to which each atom belongs.
+        Components are numbered in order of their first atom.
+        """
+
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        n = len(self)
+        matrix = csr_matrix((numpy.ones(self.indices.shape[0], dtype=bool), self.indices, self.indptr), shape=(n, n))
+
+        _, labels = connected_components(matrix, directed=False)
+
+        # renumber in order of first atom
+        _, first, inverse = numpy.unique(labels, return_index=True, return_inverse=True)
+        rank = numpy.empty(first.shape[0], dtype=numpy.int64)
+        rank[numpy.argsort(first)] = numpy.arange(first.shape[0])
+
+        return rank[inverse]
@@ -0,0 +1,84 @@
+"""
+Asyncio-friendly API: CPU-heavy work runs in an executor (a thread pool, by default), so that it does not block the
+event loop.
+"""
+
+import asyncio
+import concurrent.futures
+import inspect
+from typing import Any, Iterable, Optional, Union, TYPE_CHECKING
+
+from just_psf import logger
+from just_psf.geometry import Geometry, PDBGeometry
+
+if TYPE_CHECKING:
+    from just_psf.geometry_analyzer import GeometryAnalyzer
+
+
+l_logger = logger.getChild(__name__)
+
+
+async def write_async(
+    f: Any,
+    chunks: Union[str, Iterable[str]],
+    executor: Optional[concurrent.futures.Executor] = None
+):
+    """Write `chunks` (e.g., from `Structure.iter_psf()`) into `f`, which is either a regular (text) file, an object
+    with a coroutine `write()`, or an `asyncio.StreamWriter` (then, text is encoded in UTF-8).
+
+    Chunks are produced in `executor`, one at a time, and each is written before the next one is produced, so that at
+    most one chunk is in memory. If the task is cancelled, the writing stops after the current chunk.
+    """
+
+    loop = asyncio.get_running_loop()
+    iterator = iter([chunks] if isinstance(chunks, str) else chunks)
+
+    # the work done in the executor cannot be interrupted, so it is shielded from cancellation, and waited for
+    pending = None
+
+    try:
+        while True:
+            pending = loop.run_in_executor(executor, next, iterator, None)
+            chunk = await asyncio.shield(pending)
+
+            if chunk is None:
+                break
+
+            if isinstance(f, asyncio.StreamWriter):
+                f.write(chunk.encode('utf-8'))
+                await f.drain()
+            elif inspect.iscoroutinefunction(getattr(f, 'write', None)):
+                await f.write(chunk)
+            else:
+                pending = loop.run_in_executor(executor, f.write, chunk)
+                await asyncio.shield(pending)
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+
+async def analyze_async(
+    geometry: Union[str, Geometry],
+    executor: Optional[concurrent.futures.Executor] = None,
+    **kwargs
+) -> 'GeometryAnalyzer':
+    """Get a `GeometryAnalyzer` (with `**kwargs` as parameters) for `geometry`, which is either a `Geometry` or the
+    path to a XYZ or PDB file.
+    """
+
+    from just_psf.geometry_analyzer import GeometryAnalyzer
+
+    def analyze():
+        if isinstance(geometry, str):
+            with open(geometry) as f:
+                if geometry.lower().endswith('.pdb'):
+                    return GeometryAnalyzer(PDBGeometry.from_pdb(f), **kwargs)
+                else:
+                    return GeometryAnalyzer(Geometry.from_xyz(f), **kwargs)
+
+        return GeometryAnalyzer(geometry, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(executor, analyze)
@@ -0,0 +1,216 @@
+import array
+from typing import Iterable, Iterator, Optional, Union, List, Any
+
+import numpy
+from numpy.typing import NDArray, DTypeLike
+
+
+CHUNK_SIZE = 65536
+
+
+class Column:
+    """A list-like wrapper around a (1D) numpy array, used to store per-atom data.
+
+    Items are returned as Python scalars, and a column compares equal to any sequence with the same items
+    (so that it can be used in place of a list).
+    """
+
+    def __init__(self, values: Union[Iterable, NDArray], dtype: DTypeLike):
+        if isinstance(values, Column):
+            values = values.values
+        elif isinstance(values, Iterator):
+            values = list(values)
+
+        self.values = numpy.asarray(values, dtype=dtype).reshape(-1)
+
+    @property
+    def dtype(self) -> numpy.dtype:
+        return self.values.dtype
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __array__(self, dtype: DTypeLike = None, copy: Optional[bool] = None) -> NDArray:
+        return self.values if dtype is None else self.values.astype(dtype)
+
+    def __iter__(self) -> Iterator:
+        for start in range(0, len(self), CHUNK_SIZE):
+            yield from self.values[start:start + CHUNK_SIZE].tolist()
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, numpy.integer)):
+            return self.values[item].item()
+
+        return self._take(item)
+
+    def _take(self, item) -> 'Column':
+        return Column(self.values[item].copy(), self.dtype)
+
+    def __setitem__(self, item, value):
+        self.values[item] = value
+
+    def __eq__(self, other: Any) -> bool:
+        if other is None:
+            return False
+
+        if isinstance(other, Column):
+            other = other.values
+
+        other = numpy.asarray(other)
+        return other.shape == self.values.shape and bool(numpy.all(self.values == other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return '{}({})'.format(type(self).__name__, self.tolist())
+
+    def tolist(self) -> list:
+        return list(self)
+
+    def copy(self) -> 'Column':
+        return self._take(slice(None))
+
+    @classmethod
+    def concatenate(cls, columns: List['Column']) -> 'Column':
+        """Concatenate columns (of the same type)"""
+
+        return Column(numpy.concatenate([c.values for c in columns]), columns[0].dtype)
+
+
+class CategoricalColumn(Column):
+    """A column of strings, stored as codes (indices in `categories`).
+    """
+
+    def __init__(self, values: Optional[Union[Iterable[str], NDArray]] = None, **kwargs):
+        if isinstance(values, CategoricalColumn):
+            kwargs = {'codes': values.codes.copy(), 'categories': values.categories}
+        elif values is not None:
+            if isinstance(values, Column):
+                values = values.values
+            elif isinstance(values, Iterator):
+                values = list(values)
+
+            categories, codes = numpy.unique(numpy.asarray(values, dtype=str), return_inverse=True)
+            kwargs = {'codes': codes, 'categories': categories.tolist()}
+
+        self.codes = numpy.asarray(kwargs['codes'], dtype=numpy.int32).reshape(-1)
+        self.categories: List[str] = list(kwargs['categories'])
+        self._lookup = dict((c, i) for i, c in enumerate(self.categories))
+
+    @classmethod
+    def from_codes(cls, codes: NDArray[int], categories: List[str]) -> 'CategoricalColumn':
+        return cls(codes=codes, categories=categories)
+
+    @property
+    def values(self) -> NDArray:
+        """Decoded values, as an array of strings"""
+
+        return numpy.array(self.categories, dtype=str)[self.codes] if len(self.categories) > 0 \
+            else numpy.empty(self.codes.shape, dtype=str)
+
+    @property
+    def dtype(self) -> numpy.dtype:
+        return numpy.dtype(str)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(c) for c in self.categories)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __iter__(self) -> Iterator[str]:
+        categories = self.categories
+        for start in range(0, len(self), CHUNK_SIZE):
+            yield from (categories[c] for c in self.codes[start:start + CHUNK_SIZE].tolist())
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, numpy.integer)):
+            return self.categories[self.codes[item]]
+
+        return self._take(item)
+
+    def _take(self, item) -> 'CategoricalColumn':
+        return CategoricalColumn.from_codes(self.codes[item].copy(), self.categories)
+
+    @classmethod
+    def concatenate(cls, columns: List['CategoricalColumn']) -> 'CategoricalColumn':
+        """Concatenate categorical columns, merging their categories"""
+
+        result = CategoricalColumn.from_codes(numpy.empty((0, ), dtype=numpy.int32), [])
+
+        codes = []
+        for column in columns:
+            remap = numpy.array([result.code(c) for c in column.categories], dtype=numpy.int32)
+            codes.append(remap[column.codes] if len(remap) > 0 else column.codes)
+
+        result.codes = numpy.concatenate(codes) if len(codes) > 0 else result.codes
+        return result
+
+    def code(self, value: str) -> int:
+        """Get the code of `value`, which is added to the categories if needed"""
+
+        if value not in self._lookup:
+            self._lookup[value] = len(self.categories)
+            self.categories.append(value)
+
+        return self._lookup[value]
+
+    def __setitem__(self, item, value):
+        if isinstance(value, str):
+            self.codes[item] = self.code(value)
+        else:
+            self.codes[item] = [self.code(v) for v in value]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, CategoricalColumn) and other.categories == self.categories:
+            return numpy.array_equal(self.codes, other.codes)
+
+        return super().__eq__(other)
+
+    __hash__ = None
+
+
+class CategoricalBuilder:
+    """Build a categorical column one value at a time (e.g., when parsing), without keeping the strings.
+    """
+
+    def __init__(self):
+        self.codes = array.array('i')
+        self.lookup = {}
+
+    def append(self, value: str):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.lookup)
+
+        self.codes.append(code)
+
+    def column(self) -> CategoricalColumn:
+        categories = [''] * len(self.lookup)
+        for value, code in self.lookup.items():
+            categories[code] = value
+
+        return CategoricalColumn.from_codes(numpy.frombuffer(self.codes, dtype=numpy.int32), categories)
+
+
+def as_column(values: Optional[Union[Iterable, NDArray]], dtype: DTypeLike) -> Optional[Column]:
+    """Convert `values` to a column (if not `None`)"""
+
+    if values is None:
+        return None
+
+    return Column(values, dtype)
+
+
+def as_categorical(values: Optional[Union[Iterable[str], NDArray]]) -> Optional[CategoricalColumn]:
+    """Convert `values` to a categorical column (if not `None`)"""
+
+    if values is None:
+        return None
+
+    return CategoricalColumn(values)
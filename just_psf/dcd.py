@@ -0,0 +1,278 @@
+"""
+DCD trajectories (as written by CHARMM, NAMD or X-PLOR), read and written through `numpy.memmap`.
+
+A DCD file is a sequence of Fortran records (each enclosed by its size, as a 32-bit integer): a header (with `CORD`
+and 20 control integers), the titles, the number of atoms, then, for each frame, the unit cell (CHARMM only, if any)
+and the X, Y and Z coordinates (in single precision).
+"""
+
+import pathlib
+from typing import List, Optional, Union
+
+import numpy
+from numpy.typing import NDArray
+
+from just_psf import logger
+from just_psf.geometry import Geometry
+
+
+l_logger = logger.getChild(__name__)
+
+
+class DCDError(Exception):
+    pass
+
+
+def frame_dtype(n_atoms: int, has_cell: bool = False, has_4d: bool = False, endian: str = '<') -> numpy.dtype:
+    """Get the (structured) type of a frame, record markers included"""
+
+    fields = []
+    if has_cell:
+        fields += [('_cell_head', endian + 'i4'), ('cell', endian + 'f8', (6, )), ('_cell_tail', endian + 'i4')]
+
+    for axis in 'xyzw'[:4 if has_4d else 3]:
+        fields += [
+            ('_{}_head'.format(axis), endian + 'i4'),
+            (axis, endian + 'f4', (n_atoms, )),
+            ('_{}_tail'.format(axis), endian + 'i4')
+        ]
+
+    return numpy.dtype(fields)
+
+
+def _record(data: bytes, endian: str) -> bytes:
+    marker = numpy.array([len(data)], dtype=endian + 'i4').tobytes()
+    return marker + data + marker
+
+
+class DCD:
+    """A DCD trajectory, mapped in memory (use `mode='r+'` to modify the coordinates in place).
+
+    Frames are given as (N, 3) views of the file (`self[i]`, or `self.positions` for all of them), in single precision
+    and in the endianness of the file, so they can be used directly in a `Geometry` (see `self.geometry()`).
+    Unit cells (if any, CHARMM only) are given in the order of the file, that is, `[A, gamma, B, beta, alpha, C]`.
+    Fixed atoms are not supported.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path], mode: str = 'r'):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._read_header(f)
+            offset = f.tell()
+
+        self.dtype = frame_dtype(self.n_atoms, self.has_cell, self.has_4d, self.endian)
+
+        size = pathlib.Path(path).stat().st_size
+        n_frames = (size - offset) // self.dtype.itemsize
+
+        if (size - offset) % self.dtype.itemsize != 0:
+            l_logger.warning('`{}` ends with an incomplete frame, which is ignored'.format(path))
+
+        if n_frames != self.n_frames_header:
+            l_logger.info('`{}` contains {} frame(s), but its header says {}'.format(
+                path, n_frames, self.n_frames_header))
+
+        if n_frames > 0:
+            self.frames = numpy.memmap(path, dtype=self.dtype, mode=mode, offset=offset, shape=(n_frames, ))
+        else:
+            self.frames = numpy.zeros(0, dtype=self.dtype)
+
+        # (F, N, 3) view, from the X, Y and Z records
+        x = self.frames['x']
+        self.positions = numpy.lib.stride_tricks.as_strided(
+            x,
+            shape=(n_frames, self.n_atoms, 3),
+            strides=(self.dtype.itemsize, x.strides[1], self.dtype.fields['y'][1] - self.dtype.fields['x'][1]),
+            writeable=mode != 'r'
+        )
+
+    def _read_header(self, f):
+        head = f.read(4)
+
+        for endian in '<>':
+            if len(head) == 4 and numpy.frombuffer(head, dtype=endian + 'i4')[0] == 84:
+                break
+        else:
+            raise DCDError('`{}` is not a DCD file (or uses 64-bit record markers)'.format(self.path))
+
+        self.endian = endian
+
+        def read_record() -> bytes:
+            size = numpy.frombuffer(f.read(4), dtype=endian + 'i4')[0]
+            data = f.read(size)
+            if len(data) != size or numpy.frombuffer(f.read(4), dtype=endian + 'i4')[0] != size:
+                raise DCDError('`{}` is truncated or corrupted'.format(self.path))
+
+            return data
+
+        f.seek(0)
+        header = read_record()
+        if header[:4] != b'CORD':
+            raise DCDError('`{}` is not a DCD file of coordinates'.format(self.path))
+
+        icntrl = numpy.frombuffer(header[4:], dtype=endian + 'i4')
+
+        self.n_frames_header = int(icntrl[0])
+        self.istart = int(icntrl[1])
+        self.nsavc = int(icntrl[2])
+        self.charmm_version = int(icntrl[19])
+
+        if self.is_charmm:
+            self.delta = float(numpy.frombuffer(header[40:44], dtype=endian + 'f4')[0])
+            self.has_cell = icntrl[10] != 0
+            self.has_4d = icntrl[11] != 0
+        else:  # X-PLOR
+            self.delta = float(numpy.frombuffer(header[40:48], dtype=endian + 'f8')[0])
+            self.has_cell = self.has_4d = False
+
+        if icntrl[8] != 0:
+            raise DCDError('`{}` contains fixed atoms, which are not supported'.format(self.path))
+
+        titles = read_record()
+        n_titles = int(numpy.frombuffer(titles[:4], dtype=endian + 'i4')[0])
+        self.titles = [
+            titles[4 + 80 * i:4 + 80 * (i + 1)].decode('ascii', errors='replace').rstrip(' \x00')
+            for i in range(n_titles)
+        ]
+
+        self.n_atoms = int(numpy.frombuffer(read_record(), dtype=endian + 'i4')[0])
+
+    @property
+    def is_charmm(self) -> bool:
+        return self.charmm_version != 0
+
+    @property
+    def cells(self) -> Optional[NDArray[float]]:
+        """Unit cells, as a (F, 6) view, if any"""
+
+        return self.frames['cell'] if self.has_cell else None
+
+    def __len__(self) -> int:
+        return self.frames.shape[0]
+
+    def __getitem__(self, item) -> NDArray[float]:
+        return self.positions[item]
+
+    def geometry(self, i: int, symbols: List[str]) -> Geometry:
+        """Get frame `i` as a geometry (without copy)"""
+
+        return Geometry(symbols, self.positions[i])
+
+    def flush(self):
+        if isinstance(self.frames, numpy.memmap):
+            self.frames.flush()
+
+
+class DCDWriter:
+    """Write a DCD trajectory, frame by frame (or by chunks of frames, see `self.write()`).
+    The number of frames in the header is updated when the file is closed.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        n_atoms: int,
+        has_cell: bool = False,
+        titles: Optional[List[str]] = None,
+        istart: int = 0,
+        nsavc: int = 1,
+        delta: float = 1.0,
+        charmm: bool = True,
+        endian: str = '<'
+    ):
+        if has_cell and not charmm:
+            raise DCDError('X-PLOR DCD files cannot contain unit cells')
+
+        self.n_atoms = n_atoms
+        self.has_cell = has_cell
+        self.istart = istart
+        self.nsavc = nsavc
+        self.delta = delta
+        self.charmm = charmm
+        self.endian = endian
+
+        self.dtype = frame_dtype(n_atoms, has_cell, False, endian)
+        self.n_frames = 0
+
+        self.f = open(path, 'wb')
+        self.f.write(self._header())
+
+        titles = titles if titles is not None else ['Created by just-psf']
+        self.f.write(_record(numpy.array([len(titles)], dtype=endian + 'i4').tobytes() + b''.join(
+            t.encode('ascii', errors='replace')[:80].ljust(80) for t in titles), endian))
+
+        self.f.write(_record(numpy.array([n_atoms], dtype=endian + 'i4').tobytes(), self.endian))
+
+    def _header(self) -> bytes:
+        icntrl = numpy.zeros(20, dtype=self.endian + 'i4')
+        icntrl[0] = self.n_frames
+        icntrl[1] = self.istart
+        icntrl[2] = self.nsavc
+        icntrl[3] = self.nsavc * self.n_frames
+
+        if self.charmm:
+            icntrl[10] = self.has_cell
+            icntrl[19] = 24
+            data = icntrl[:9].tobytes() + numpy.array([self.delta], dtype=self.endian + 'f4').tobytes() + \
+                icntrl[10:].tobytes()
+        else:
+            data = icntrl[:9].tobytes() + numpy.array([self.delta], dtype=self.endian + 'f8').tobytes() + \
+                icntrl[11:].tobytes()
+
+        return _record(b'CORD' + data, self.endian)
+
+    def write(self, positions: NDArray[float], cells: Optional[NDArray[float]] = None):
+        """Write a frame, `positions` being a (N, 3) array (and `cell` the 6 values of the unit cell, if any), or many
+        frames, `positions` being a (F, N, 3) array (and `cells` a (F, 6) array).
+        """
+
+        positions = numpy.asarray(positions)
+        if positions.ndim == 2:
+            positions = positions[numpy.newaxis]
+            cells = None if cells is None else numpy.asarray(cells).reshape(1, 6)
+
+        assert positions.shape[1:] == (self.n_atoms, 3)
+        assert (cells is not None) == self.has_cell
+
+        frames = numpy.empty(positions.shape[0], dtype=self.dtype)
+        for name in self.dtype.names:
+            if name.startswith('_'):
+                frames[name] = self.dtype.fields[name[1:].rsplit('_', 1)[0]][0].itemsize
+
+        if self.has_cell:
+            frames['cell'] = cells
+
+        for i, axis in enumerate('xyz'):
+            frames[axis] = positions[:, :, i]
+
+        frames.tofile(self.f)
+        self.n_frames += positions.shape[0]
+
+    def close(self):
+        if self.f.closed:
+            return
+
+        self.f.seek(0)
+        self.f.write(self._header())
+        self.f.close()
+
+    def __enter__(self) -> 'DCDWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def write_dcd(
+    path: Union[str, pathlib.Path],
+    positions: NDArray[float],
+    cells: Optional[NDArray[float]] = None,
+    **kwargs
+):
+    """Write a (F, N, 3) array of positions (and a (F, 6) array of unit cells, if any) in a DCD file, `**kwargs`
+    being the other parameters of `DCDWriter`.
+    """
+
+    with DCDWriter(path, positions.shape[1], has_cell=cells is not None, **kwargs) as writer:
+        writer.write(positions, cells)
@@ -2,7 +2,7 @@ import numpy
 from typing import TextIO, List, Optional
 from numpy.typing import NDArray
 
-from just_psf import logger
+from just_psf import logger, residues
 
 
 l_logger = logger.getChild(__name__)
@@ -81,6 +81,31 @@ class PDBGeometry(Geometry):
         self.resi_names = resi_names
         self.atom_names = atom_names
 
+    def residue_starts(self) -> NDArray[int]:
+        """Get the index of the first atom of each residue (see `just_psf.residues`).
+        Without residue ids, everything is a single residue.
+        """
+
+        return residues.residue_starts(len(self), [self.seg_names, self.resi_ids, self.resi_names])
+
+    def residue_centers(self) -> NDArray[float]:
+        """Get the center of mass of each residue (with standard atomic weights)"""
+
+        from just_psf.geometry_analyzer import ATOMIC_WEIGHTS
+
+        masses = numpy.array([ATOMIC_WEIGHTS[s] for s in self.symbols])
+        return residues.centers_of_mass(self.positions, masses, self.residue_starts())
+
+    def residue_bounding_boxes(self) -> NDArray[float]:
+        """Get the bounding box of each residue"""
+
+        return residues.bounding_boxes(self.positions, self.residue_starts())
+
+    def residue_formulas(self) -> List[str]:
+        """Get the formula of each residue"""
+
+        return residues.formulas(self.symbols, self.residue_starts())
+
     @classmethod
     def from_pdb(cls, f: TextIO) -> 'PDBGeometry':
         from just_psf.parsers.pdb import PDBParser
@@ -1,13 +1,18 @@
-from typing import Union, List, Tuple
+from typing import Union, List, Tuple, Optional
 
 import networkx
 import numpy
-from scipy.spatial import distance_matrix
+from numpy.typing import NDArray
 from typing import Iterable
 import queue
+import tempfile
+import threading
 
 from just_psf import logger
+from just_psf.adjacency import Adjacency
 from just_psf.geometry import Geometry, PDBGeometry
+from just_psf.parsers.rtop import IndexedTopologies
+from just_psf.residue_cache import ResidueCache, CachedResidue
 from just_psf.residue_topology import Topologies, ResidueTopology
 from just_psf.structure import Structure
 
@@ -114,6 +119,13 @@ COVALENT_RADII = {  # from 10.1039/B801115J
     'Cm': 1.69,
 }
 
+# hydrogen-bond donors (when bonded to an hydrogen) and acceptors
+DONOR_ELEMENTS = ('N', 'O', 'S')
+ACCEPTOR_ELEMENTS = ('N', 'O', 'F')
+
+# strict enough not to take united atoms (e.g., CH2, 14.027) for another element (N)
+MASS_TOLERANCE = 0.015
+
 ATOMIC_WEIGHTS = {  # from https://iupac.qmul.ac.uk/AtWt/
     'H': 1.008,
     'He': 4.003,
@@ -268,6 +280,135 @@ def find_subgraphs(g: networkx.Graph, k: int) -> Iterable[tuple]:
             yield subgraph
 
 
+def canonical_terms(terms: Iterable[tuple]) -> List[tuple]:
+    """Orient each of `terms` (e.g., angles or dihedrals) so that its first atom is lower than its last, and sort them,
+    so that they do not depend on the order in which they were found (or on whether they came from a cache).
+    """
+
+    return sorted(t if t[0] < t[-1] else t[::-1] for t in map(tuple, terms))
+
+
+def neighbor_pairs(
+    positions: NDArray[float],
+    symbols: List[str],
+    max_threshold: float = 1.1,
+    cell: Optional[NDArray[float]] = None
+) -> Tuple[NDArray[int], NDArray[float]]:
+    """Find the pairs of atoms `(i, j)`, with `i < j`, whose distance is less than `max_threshold` times the sum of
+    their covalent radii, together with this ratio. Pairs are sorted.
+    Only neighbors are considered (using a KD-tree), so that no distance matrix is computed.
+    If an (orthorhombic) `cell` is given, distances follow the minimum image convention (see `just_psf.periodic`).
+    """
+
+    from scipy.spatial import cKDTree
+
+    if len(symbols) < 2:
+        return numpy.zeros((0, 2), dtype=numpy.int64), numpy.zeros(0)
+
+    radii = covalent_radii(symbols)
+
+    if cell is None:
+        tree = cKDTree(positions)
+    else:
+        from just_psf.periodic import box_lengths
+
+        lengths = box_lengths(cell)
+        wrapped = numpy.mod(positions, lengths)
+        wrapped[wrapped >= lengths] = 0  # rounding
+        tree = cKDTree(wrapped, boxsize=lengths)
+
+    pairs = tree.query_pairs(max_threshold * 2 * radii.max(), output_type='ndarray').astype(numpy.int64)
+    pairs.sort(axis=1)
+
+    vectors = positions[pairs[:, 0]] - positions[pairs[:, 1]]
+    if cell is not None:
+        from just_psf.periodic import minimum_image
+        vectors = minimum_image(vectors, cell)
+
+    ratios = numpy.linalg.norm(vectors, axis=1) / (radii[pairs[:, 0]] + radii[pairs[:, 1]])
+
+    is_neighbor = ratios < max_threshold
+    pairs, ratios = pairs[is_neighbor], ratios[is_neighbor]
+
+    order = numpy.lexsort((pairs[:, 1], pairs[:, 0]))
+    return pairs[order], ratios[order]
+
+
+def residue_neighbor_pairs(
+    positions: NDArray[float],
+    symbols: List[str],
+    starts: NDArray[int],
+    max_threshold: float = 1.1,
+    cell: Optional[NDArray[float]] = None,
+    max_window: int = 256,
+    chunk_size: int = 2 ** 20
+) -> Tuple[NDArray[int], NDArray[float]]:
+    """Same as `neighbor_pairs()`, but only for the atoms within a residue or in two adjacent ones, residues being runs
+    of consecutive atoms that start at `starts`.
+
+    Only the atoms of each residue and of the next one (a "window") are compared, so that the search is linear in the
+    number of residues. Windows of the same size are processed together, by chunks of (at most) `chunk_size` pairs,
+    while windows larger than `max_window` atoms are searched with a KD-tree.
+    """
+
+    n = len(symbols)
+    if n < 2:
+        return numpy.zeros((0, 2), dtype=numpy.int64), numpy.zeros(0)
+
+    radii = covalent_radii(symbols)
+
+    # window of residue k: its atoms, then those of residue k + 1 (if any), the first atom of a pair being in k
+    bounds = numpy.append(numpy.asarray(starts, dtype=numpy.int64), n)
+    firsts = bounds[:-1]
+    lengths = numpy.diff(bounds)
+    sizes = lengths + numpy.append(lengths[1:], 0)
+
+    all_pairs, all_ratios = [], []
+
+    for size in numpy.unique(sizes).tolist():
+        windows = numpy.flatnonzero(sizes == size)
+
+        if size > max_window:
+            for w in windows.tolist():
+                first = firsts[w]
+                pairs, ratios = neighbor_pairs(
+                    positions[first:first + size], symbols[first:first + size], max_threshold, cell)
+
+                is_first = pairs[:, 0] < lengths[w]
+                all_pairs.append(pairs[is_first] + first)
+                all_ratios.append(ratios[is_first])
+
+            continue
+
+        local = numpy.stack(numpy.triu_indices(size, 1), axis=-1)
+        if local.shape[0] == 0:
+            continue
+
+        step = max(1, chunk_size // local.shape[0])
+        for begin in range(0, windows.shape[0], step):
+            chunk = windows[begin:begin + step]
+            pairs = firsts[chunk, numpy.newaxis, numpy.newaxis] + local  # (W, P, 2)
+
+            vectors = positions[pairs[..., 0]] - positions[pairs[..., 1]]
+            if cell is not None:
+                from just_psf.periodic import minimum_image
+                vectors = minimum_image(vectors, cell)
+
+            ratios = numpy.linalg.norm(vectors, axis=-1) / (radii[pairs[..., 0]] + radii[pairs[..., 1]])
+
+            is_neighbor = (ratios < max_threshold) & (local[:, 0] < lengths[chunk, numpy.newaxis])
+            all_pairs.append(pairs[is_neighbor])
+            all_ratios.append(ratios[is_neighbor])
+
+    if len(all_pairs) == 0:
+        return numpy.zeros((0, 2), dtype=numpy.int64), numpy.zeros(0)
+
+    pairs, ratios = numpy.concatenate(all_pairs), numpy.concatenate(all_ratios)
+
+    order = numpy.lexsort((pairs[:, 1], pairs[:, 0]))
+    return pairs[order], ratios[order]
+
+
 class MolecularSubgraph:
     """A subgraph which represent a "molecule", i.e., a connected component in said graph.
     """
@@ -293,162 +434,1030 @@ class MolecularSubgraph:
         return len(self.subgraph.nodes)
 
 
-class GeometryAnalyzer:
-    def __init__(self, geometry: Union[str, Geometry], threshold: float = 1.1):
-        if type(geometry) is str:
-            with open(geometry) as f:
-                self.geometry = Geometry.from_xyz(f)
-        elif type(geometry) is Geometry:
-            self.geometry = geometry
+def element_from_mass(mass: float, tolerance: float = MASS_TOLERANCE) -> Optional[str]:
+    """Guess the element corresponding to a given (atomic) mass, if any is found within `tolerance`.
+    """
+
+    symbol = min(ATOMIC_WEIGHTS, key=lambda k: abs(ATOMIC_WEIGHTS[k] - mass))
+    return symbol if abs(ATOMIC_WEIGHTS[symbol] - mass) <= tolerance else None
+
+
+def guess_symbols(structure: Structure, tolerance: float = MASS_TOLERANCE) -> List[str]:
+    """Guess the element of each atom of `structure` from its mass (within `tolerance`), or, if not available (or
+    not an element, e.g., with hydrogen mass repartitioning), its type, if it is an element.
+    Raise `ValueError` if some atoms cannot be resolved.
+    """
+
+    symbols = list(structure.atom_types)
+
+    if structure.masses is not None:
+        masses, inverse = numpy.unique(numpy.asarray(structure.masses), return_inverse=True)
+        elements = [element_from_mass(mass, tolerance) for mass in masses.tolist()]
+        symbols = [
+            elements[k] if elements[k] is not None else atom_type
+            for k, atom_type in zip(inverse.tolist(), symbols)
+        ]
+
+    unknown = set(symbols) - set(ATOMIC_WEIGHTS)
+    if len(unknown) > 0:
+        raise ValueError('cannot guess element for types {} (from their {}), give the elements explicitly'.format(
+            ', '.join(sorted(unknown)), 'masses or names' if structure.masses is not None else 'names, no masses'))
+
+    return symbols
+
+
+def covalent_radii(symbols: List[str]) -> NDArray[float]:
+    """Get the covalent radius of each element of `symbols`.
+    Raise `ValueError` if some are not elements.
+    """
+
+    unknown = set(symbols) - set(COVALENT_RADII)
+    if len(unknown) > 0:
+        raise ValueError('no covalent radius for {}, which should be elements'.format(', '.join(sorted(unknown))))
+
+    return numpy.array([COVALENT_RADII[s] for s in symbols])
+
+
+def donors_acceptors(symbols: List[str], adjacency: Adjacency) -> Tuple[NDArray[int], NDArray[int]]:
+    """Find the hydrogen-bond donors and acceptors, from the elements and bonds (given by `adjacency`) only.
+
+    Donors are pairs `(heavy atom, hydrogen)`, for each hydrogen bonded to an atom of `DONOR_ELEMENTS`.
+    Acceptors are pairs `(acceptor, antecedent)`, for each atom of `ACCEPTOR_ELEMENTS` with less than 4 neighbors,
+    the antecedent being its first heavy neighbor (or -1 if none, e.g., for water).
+    Both are sorted.
+    """
+
+    symbols = numpy.array(symbols)
+    is_hydrogen = symbols == 'H'
+
+    sources, neighbors = adjacency.expand(numpy.arange(len(adjacency)))
+
+    is_donor = numpy.isin(symbols[sources], DONOR_ELEMENTS) & is_hydrogen[neighbors]
+    donors = numpy.stack([sources[is_donor], neighbors[is_donor]], axis=1)
+
+    # neighbors are sorted, so the first heavy neighbor is the first occurrence of the source
+    is_heavy = ~is_hydrogen[neighbors]
+    heavy_sources, first = numpy.unique(sources[is_heavy], return_index=True)
+    antecedents = numpy.full(len(adjacency), -1, dtype=numpy.int64)
+    antecedents[heavy_sources] = neighbors[is_heavy][first]
+
+    acceptors = numpy.flatnonzero(numpy.isin(symbols, ACCEPTOR_ELEMENTS) & (adjacency.degrees() < 4))
+    acceptors = numpy.stack([acceptors, antecedents[acceptors]], axis=1)
+
+    return donors, acceptors
+
+
+def out_of_plane_angles(positions: NDArray[float], impropers: NDArray[int]) -> NDArray[float]:
+    """Get the angle (in degrees) between the bond from the central atom (first) of each improper to the last one,
+    and the plane formed by the central atom and the two others. It is 0 for planar centers.
+    """
+
+    center = positions[impropers[:, 0]]
+    normals = numpy.cross(positions[impropers[:, 1]] - center, positions[impropers[:, 2]] - center)
+    bonds = positions[impropers[:, 3]] - center
+
+    sines = numpy.abs(numpy.einsum('ij,ij->i', normals, bonds)) / (
+        numpy.linalg.norm(normals, axis=1) * numpy.linalg.norm(bonds, axis=1))
+
+    return numpy.degrees(numpy.arcsin(numpy.clip(sines, 0, 1)))
+
+
+def graph_hash(g: networkx.Graph) -> str:
+    """Invariant (element-labelled) hash of a molecular graph: two isomorphic graphs share the same hash,
+    although the reverse is not guaranteed.
+    """
+
+    return networkx.weisfeiler_lehman_graph_hash(g, node_attr='symbol')
+
+
+def canonical_order(g: networkx.Graph) -> List[int]:
+    """Order the nodes of `g` by (element-labelled) color refinement, so that isomorphic graphs generally get their
+    atoms in the same order.
+    It is not a true canonical form, since the ties between non-equivalent atoms are broken by index.
+    """
+
+    colors = dict((n, g.nodes[n]['symbol']) for n in g.nodes)
+    n_colors = len(set(colors.values()))
+
+    while True:
+        signatures = dict((n, (colors[n], tuple(sorted(colors[m] for m in g.adj[n])))) for n in g.nodes)
+        ranks = dict((sig, i) for i, sig in enumerate(sorted(set(signatures.values()))))
+        colors = dict((n, ranks[signatures[n]]) for n in g.nodes)
+
+        if len(ranks) == n_colors:
+            break
+
+        n_colors = len(ranks)
+
+    return sorted(g.nodes, key=lambda n: (colors[n], n))
+
+
+def find_isomorphism(g1: networkx.Graph, g2: networkx.Graph) -> Optional[dict]:
+    """Get a mapping from the nodes of `g1` to the ones of `g2` if they are isomorphic (elements are taken into
+    account), `None` otherwise.
+    """
+
+    if len(g1) != len(g2) or g1.number_of_edges() != g2.number_of_edges():
+        return None
+
+    gm = networkx.isomorphism.GraphMatcher(
+        g1,
+        g2,
+        node_match=networkx.isomorphism.categorical_node_match('symbol', 'X')
+    )
+
+    if gm.is_isomorphic():
+        return gm.mapping  # This mapping is not unique, though
+
+    return None
+
+
+class ResidueTemplates:
+    """Index over a library of residue topologies (e.g., obtained from `RTopParser`), so that a molecular graph can
+    be matched against them by (element-labelled) graph isomorphism.
+    The element of each atom is guessed from the mass of its type, with the same tolerance as `guess_symbols()`.
+    Residues are bucketed by `graph_hash()`, so that only a few candidates are actually tested.
+
+    If the library is indexed (`IndexedTopologies`), residues are only parsed when a graph with the same number of
+    atoms is matched for the first time.
+    """
+
+    def __init__(self, topologies: Topologies):
+        self.topologies = topologies
+        self.buckets = {}
+
+        # residues not parsed yet, by number of atoms
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        if isinstance(topologies, IndexedTopologies) and topologies.index.n_atoms is not None:
+            for resi_name in topologies.resi_names():
+                self.pending.setdefault(topologies.index.n_atoms[resi_name], []).append(resi_name)
+
+            l_logger.info('indexed {} residue template(s), to be parsed on demand'.format(
+                len(topologies.resi_names())))
         else:
-            raise TypeError('geometry')
+            for resi_name in topologies.resi_names():
+                self._add(resi_name)
 
-        # create graph
-        self.g = networkx.Graph()
-        self.g.add_nodes_from((i, {'symbol': self.geometry.symbols[i]}) for i in range(len(geometry)))
-        self._guess_bonds(threshold)
+            l_logger.info('indexed {} residue template(s)'.format(sum(len(b) for b in self.buckets.values())))
+
+    def _add(self, resi_name: str):
+        residue = self.topologies.residue(resi_name)
+        g = self.residue_graph(residue)
+        if g is None:
+            l_logger.debug('cannot use residue `{}` as a template'.format(resi_name))
+            return
+
+        self.buckets.setdefault(graph_hash(g), []).append((residue, g))
+
+    def residue_graph(self, residue: ResidueTopology) -> Optional[networkx.Graph]:
+        """Get the molecular graph of a residue, without bonds to other residues.
+        Return `None` if the element of an atom cannot be determined.
+        """
+
+        g = networkx.Graph()
+
+        for i, atom_type in enumerate(residue.atom_types):
+            symbol = element_from_mass(self.topologies.masses.get(atom_type, -1))
+            if symbol is None:
+                return None
+
+            g.add_node(i, symbol=symbol)
+
+        g.add_edges_from((i, j) for i, j in residue.bonds if i >= 0 and j >= 0)
+
+        return g
+
+    def match(self, g: networkx.Graph) -> Optional[Tuple[ResidueTopology, dict]]:
+        """Find a residue isomorphic to `g`, and return it together with the mapping from its atoms to the nodes of
+        `g`.
+        """
+
+        # residues of this size are only removed from `pending` once they are all in the buckets, so that other
+        # threads wait for them
+        if len(g) in self.pending:
+            with self.lock:
+                for resi_name in self.pending.get(len(g), []):
+                    self._add(resi_name)
+
+                self.pending.pop(len(g), None)
+
+        for residue, template_g in self.buckets.get(graph_hash(g), []):
+            mapping = find_isomorphism(template_g, g)
+            if mapping is not None:
+                return residue, mapping
+
+        return None
+
+
+class MolecularGraphAnalyzer:
+    """Analyze a molecular graph, `g`, whose nodes are the atoms (numbered from 0 and labelled by their element,
+    `symbol`) and edges are the bonds.
+    Each connected component is a residue (unless a `partition` of the atoms into residues is given), and residues
+    whose graph are isomorphic are considered to be the same.
+    """
+
+    def __init__(
+        self,
+        g: networkx.Graph,
+        library: Optional[Union[Topologies, ResidueTemplates]] = None,
+        cache: Optional[ResidueCache] = None,
+        masses: Optional[List[float]] = None,
+        partition: Optional[Iterable[List[int]]] = None,
+    ):
+        self.g = g
+        self.symbols = [g.nodes[i]['symbol'] for i in range(len(g))]
+        self.masses = masses if masses is not None else [ATOMIC_WEIGHTS[s] for s in self.symbols]
+
+        self.cache = cache
+        self.cache_hits = 0
 
         # get and analyze connected components
-        self.atom_names = [''] * len(self.geometry)
-        self.resi_ids = [0] * len(self.geometry)
+        self.atom_names = [''] * len(self.symbols)
+        self.resi_ids = [0] * len(self.symbols)
 
         self.resi_isomorphic_to = {}
-        self.atom_isomorphic_to = [-1] * len(self.geometry)
+        self.atom_isomorphic_to = [-1] * len(self.symbols)
+        self.atom_residues = [-1] * len(self.symbols)
+        self.resi_uniq_ids = []
 
         # get unique residues and match the others to them
         self.uniq_residues = []
+        uniq_buckets = {}
+        keyed = {}
         current_resi_id = -1
-        for indices in networkx.connected_components(self.g):
+        for indices in (partition if partition is not None else networkx.connected_components(self.g)):
             current_resi_id += 1
-            subgraph = self.g.subgraph(indices)
-
-            # tries to match the current residue to another
+            indices = sorted(indices)
             uniq_resi_id = -1
-            for i, uniq in enumerate(self.uniq_residues):
-                gm = networkx.isomorphism.GraphMatcher(
-                    uniq.subgraph,
-                    subgraph,
-                    node_match=networkx.isomorphism.categorical_node_match('symbol', 'X')
-                )
-                if gm.is_isomorphic():
-                    uniq_resi_id = i
-                    mapping = gm.mapping  # This mapping is not unique, though
-                    break
 
-            if uniq_resi_id < 0:
-                uniq_resi_id = len(self.uniq_residues)
-                mapping = dict((i, i) for i in indices)
-                self.uniq_residues.append(MolecularSubgraph(subgraph))
+            # tries to match the current residue to another with the same key
+            key = self._component_key(indices)
+            if key is not None and key in keyed:
+                uniq_resi_id, uniq_nodes = keyed[key]
+                mapping = dict(zip(uniq_nodes, indices))
+            else:
+                # ... or to another with the same hash
+                subgraph = self.g.subgraph(indices)
+                bucket = uniq_buckets.setdefault(self._bucket_key(indices, subgraph), [])
+                for i in bucket:
+                    mapping = find_isomorphism(self.uniq_residues[i].subgraph, subgraph)
+                    if mapping is not None:
+                        uniq_resi_id = i
+                        break
+
+                if uniq_resi_id < 0:
+                    uniq_resi_id = len(self.uniq_residues)
+                    mapping = dict((i, i) for i in indices)
+                    self.uniq_residues.append(MolecularSubgraph(subgraph))
+                    bucket.append(uniq_resi_id)
+
+                if key is not None:
+                    inverse_mapping = dict((ai, uresi_ai) for uresi_ai, ai in mapping.items())
+                    keyed[key] = (uniq_resi_id, [inverse_mapping[ai] for ai in indices])
 
             # store isomorphism
             if uniq_resi_id not in self.resi_isomorphic_to:
                 self.resi_isomorphic_to[uniq_resi_id] = []
 
             self.resi_isomorphic_to[uniq_resi_id].append(mapping)
+            self.resi_uniq_ids.append(uniq_resi_id)
 
             # fill resi_id and atom_names
             for uresi_ai, resi_ai in mapping.items():
                 self.atom_isomorphic_to[resi_ai] = uresi_ai
+                self.atom_residues[resi_ai] = current_resi_id
                 self.resi_ids[resi_ai] = current_resi_id + 1
                 self.atom_names[resi_ai] = '{}{}'.format(
-                    self.geometry.symbols[uresi_ai],
+                    self.symbols[uresi_ai],
                     uresi_ai + 1
                 )
 
         l_logger.info('found {} residue(s) and {} unique residue(s)'.format(
-            current_resi_id, len(self.uniq_residues)))
+            current_resi_id + 1, len(self.uniq_residues)))
 
-    def _guess_bonds(self, threshold: float = 1.1):
+        # residues are components, unless a partition is given
+        self.inter_bonds = []
+        if partition is not None:
+            self.inter_bonds = [(a, b) for a, b in self.g.edges if self.atom_residues[a] != self.atom_residues[b]]
+            l_logger.info('found {} bond(s) between residues'.format(len(self.inter_bonds)))
+
+        self.atom_types = list(self.symbols)
+        self.charges = [.0] * len(self.symbols)
+        self.uniq_resi_names = ['RES{}'.format(i + 1) for i in range(len(self.uniq_residues))]
+        self.uniq_templates = [None] * len(self.uniq_residues)
+
+        # match unique residues against the library, if any
+        self.templates = None
+        if library is not None:
+            self.templates = library if isinstance(library, ResidueTemplates) else ResidueTemplates(library)
+            self._match_templates(self.templates)
+
+    def _component_key(self, indices: List[int]) -> Optional[tuple]:
+        """Get a key for a connected component (given by its sorted `indices`).
+        Two components with the same key are matched atom by atom (in order), without testing for isomorphism.
+        No key (`None`) by default.
         """
-        Guess which atom are linked to which using a distance matrix.
-        May lead to incorrect results for strange bonds (e.g., metalic)
+
+        return None
+
+    def _bucket_key(self, indices: List[int], subgraph: networkx.Graph) -> str:
+        """Get the key of the bucket of a residue (given by its sorted `indices` and its `subgraph`).
+        Only the residues within the same bucket are tested for isomorphism.
         """
-        l_logger.debug('compute distances')
-        distances = distance_matrix(self.geometry.positions, self.geometry.positions)
 
-        l_logger.debug('assign bonds')
-        for i in range(len(self.geometry)):
-            cri = COVALENT_RADII[self.geometry.symbols[i]]
-            for j in range(i + 1, len(self.geometry)):
-                crj = COVALENT_RADII[self.geometry.symbols[j]]
-                if distances[i, j] < threshold * (cri + crj):
-                    self.g.add_edge(i, j)
-
-    def structure(self, seg_name: str = 'SYS') -> Structure:
+        return graph_hash(subgraph)
+
+    def _positions(self) -> Optional[NDArray[float]]:
+        """Get the positions of the atoms, if any"""
+
+        return None
+
+    def _use_input_names(
+        self,
+        resi_names: Optional[List[str]],
+        atom_names: Optional[List[str]],
+        atom_types: Optional[List[str]] = None,
+        charges: Optional[List[float]] = None
+    ):
+        """Keep the residue name, atom names, types and charges given for each atom (if any) for the unique residues,
+        as long as they are consistent (i.e., all atoms belong to a single residue name, which is not already used by
+        another unique residue, and have distinct names).
         """
-        Get the corresponding structure.
-        Each unique set of connected components is considered as a residue.
+
+        used_resi_names = set()
+
+        for i, component in enumerate(self.uniq_residues):
+            nodes = list(component.subgraph.nodes)
+
+            if resi_names is not None:
+                component_resi_names = set(resi_names[ai] for ai in nodes)
+                if len(component_resi_names) == 1 and not component_resi_names & used_resi_names:
+                    self.uniq_resi_names[i] = component_resi_names.pop()
+
+            used_resi_names.add(self.uniq_resi_names[i])
+
+            component_atom_names = dict((ai, self.atom_names[ai]) for ai in nodes)
+            if atom_names is not None and len(set(atom_names[ai] for ai in nodes)) == len(nodes):
+                component_atom_names = dict((ai, atom_names[ai]) for ai in nodes)
+
+            self._propagate(
+                i,
+                component_atom_names,
+                dict((ai, (atom_types if atom_types is not None else self.atom_types)[ai]) for ai in nodes),
+                dict((ai, (charges if charges is not None else self.charges)[ai]) for ai in nodes),
+            )
+
+    def _propagate(self, i: int, uniq_atom_names: dict, uniq_atom_types: dict, uniq_charges: dict):
+        """Set the atom names, types and charges of all the residues isomorphic to the `i`-th unique residue,
+        given for the nodes of the latter.
         """
 
-        angles = []
-        dihedrals = []
+        for mp in self.resi_isomorphic_to[i]:
+            for uresi_ai, ai in mp.items():
+                self.atom_names[ai] = uniq_atom_names[uresi_ai]
+                self.atom_types[ai] = uniq_atom_types[uresi_ai]
+                self.charges[ai] = uniq_charges[uresi_ai]
 
-        resi_names = ['X'] * len(self.geometry)
+    def _match_templates(self, templates: ResidueTemplates):
+        """Match each unique residue against `templates`, and propagate the residue name, atom names, types and
+        charges of the template to every residue isomorphic to it.
+        """
+
+        for i, component in enumerate(self.uniq_residues):
+            match = templates.match(component.subgraph)
+            if match is None:
+                continue
+
+            residue, template_mapping = match
+            self.uniq_templates[i] = (residue, template_mapping)
+            self.uniq_resi_names[i] = residue.resi_name
+
+            l_logger.debug('unique residue {} matches `{}`'.format(i + 1, residue.resi_name))
+
+            self._propagate(
+                i,
+                dict((uresi_ai, residue.atom_names[ti]) for ti, uresi_ai in template_mapping.items()),
+                dict((uresi_ai, residue.atom_types[ti]) for ti, uresi_ai in template_mapping.items()),
+                dict((uresi_ai, residue.atom_charges[ti]) for ti, uresi_ai in template_mapping.items()),
+            )
+
+        l_logger.info('{} unique residue(s) matched a template'.format(
+            sum(1 for t in self.uniq_templates if t is not None)))
+
+    def _angles_dihedrals(self, i: int) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int, int, int]]]:
+        """Get the angles and dihedrals of the `i`-th unique residue, from the cache if possible.
+        They are given in canonical form (see `canonical_terms()`), whether they come from the cache or not.
+        """
+
+        component = self.uniq_residues[i]
+
+        if self.cache is None:
+            angles, dihedrals = component.autogenerate_angles_dihedrals()
+            return canonical_terms(angles), canonical_terms(dihedrals)
+
+        key = graph_hash(component.subgraph)
+        order = canonical_order(component.subgraph)
+
+        for cached in self.cache.get(key):
+            mapping = self._map_cached(cached, component.subgraph, order)
+            if mapping is not None:
+                l_logger.debug('found unique residue {} in cache'.format(i + 1))
+                self.cache_hits += 1
+                return (
+                    canonical_terms(mapping[cached.angles].tolist()),
+                    canonical_terms(mapping[cached.dihedrals].tolist())
+                )
+
+        angles, dihedrals = component.autogenerate_angles_dihedrals()
+
+        rank = dict((n, k) for k, n in enumerate(order))
+        self.cache.put(key, CachedResidue(
+            symbols=[self.symbols[n] for n in order],
+            bonds=[(rank[a], rank[b]) for a, b in component.subgraph.edges],
+            angles=[[rank[a] for a in angle] for angle in angles],
+            dihedrals=[[rank[a] for a in dihedral] for dihedral in dihedrals],
+        ))
+
+        return canonical_terms(angles), canonical_terms(dihedrals)
+
+    @staticmethod
+    def _map_cached(cached: CachedResidue, g: networkx.Graph, order: List[int]) -> Optional[NDArray[int]]:
+        """Map the atoms of `cached` to the nodes of `g`.
+        First try to use the canonical order, then fall back to an isomorphism.
+        """
+
+        if len(cached) != len(g) or len(cached.bonds) != g.number_of_edges():
+            return None
+
+        mapping = numpy.array(order)
+        if [g.nodes[n]['symbol'] for n in order] == cached.symbols \
+                and all(g.has_edge(a, b) for a, b in mapping[cached.bonds].tolist()):
+            return mapping
+
+        cached_g = networkx.Graph()
+        cached_g.add_nodes_from((k, {'symbol': symbol}) for k, symbol in enumerate(cached.symbols))
+        cached_g.add_edges_from(cached.bonds.tolist())
+
+        isomorphism = find_isomorphism(cached_g, g)
+        if isomorphism is None:
+            return None
+
+        return numpy.array([isomorphism[k] for k in range(len(cached))])
+
+    def _inter_angles_dihedrals(self) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int, int, int]]]:
+        """Get the angles and dihedrals that span more than one residue.
+        They are searched for in the subgraph formed by the atoms at most two bonds away from a bond between residues.
+        """
+
+        if len(self.inter_bonds) == 0:
+            return [], []
+
+        nodes = set(ai for bond in self.inter_bonds for ai in bond)
+        frontier = nodes
+        for _ in range(2):
+            frontier = set(aj for ai in frontier for aj in self.g.adj[ai]) - nodes
+            nodes |= frontier
+
+        subgraph = self.g.subgraph(nodes)
+
+        def spans_residues(path: tuple) -> bool:
+            return any(self.atom_residues[ai] != self.atom_residues[path[0]] for ai in path[1:])
+
+        return (
+            [p for p in find_subgraphs(subgraph, 3) if spans_residues(p)],
+            [p for p in find_subgraphs(subgraph, 4) if spans_residues(p)]
+        )
+
+    def _impropers(self, nodes: Iterable[int], g: networkx.Graph, planarity: Optional[float] = None) -> List[tuple]:
+        """Get the impropers of the atoms `nodes` of `g` that have exactly three neighbors: the atom comes first, then
+        its (sorted) neighbors.
+        If `planarity` is given, only (nearly) planar centers are kept, i.e., the ones whose out-of-plane angle (see
+        `out_of_plane_angles()`) is below `planarity` (in degrees).
+        """
+
+        impropers = [(ai, *sorted(g.adj[ai])) for ai in nodes if g.degree(ai) == 3]
+
+        if planarity is not None and len(impropers) > 0:
+            positions = self._positions()
+            if positions is None:
+                raise ValueError('planarity cannot be checked without positions')
+
+            is_planar = out_of_plane_angles(positions, numpy.array(impropers)) < planarity
+            impropers = [improper for improper, planar in zip(impropers, is_planar.tolist()) if planar]
+
+        return impropers
+
+    def _gather_impropers(
+        self,
+        planarity: Optional[float] = None,
+        memory_budget: Optional[int] = None
+    ) -> Optional[NDArray[int]]:
+        """Get the impropers (see `self._impropers()`) of all residues.
+        They are found once per unique residue (and thus, the planarity is only checked for the unique residue), then
+        mapped to its copies. The atoms that are bonded to other residues are handled separately, since they might
+        differ from one copy to another.
+        """
+
+        uniq_impropers = [
+            self._impropers(residue.subgraph.nodes, residue.subgraph, planarity) for residue in self.uniq_residues]
+
+        impropers = self._gather_terms(4, uniq_impropers, [], memory_budget)
+
+        if len(self.inter_bonds) == 0:
+            return impropers
+
+        boundary = sorted(set(ai for bond in self.inter_bonds for ai in bond))
+        inter_impropers = numpy.array(self._impropers(boundary, self.g, planarity), dtype=numpy.int64).reshape(-1, 4)
+
+        if impropers is not None:
+            inter_impropers = numpy.concatenate([
+                impropers[~numpy.isin(impropers[:, 0], boundary)], inter_impropers.astype(impropers.dtype)])
+
+        return inter_impropers if inter_impropers.shape[0] > 0 else None
+
+    def _declarations(self) -> List[List[Tuple[int, str]]]:
+        """Get, for each unique residue, its bonds to the next residue (as in, e.g., `BOND C +N`), as a list of
+        `(node, declaration)`.
+        Bonds between residues that are not adjacent cannot be expressed that way, and are thus ignored.
+        """
+
+        declarations = [set() for _ in self.uniq_residues]
+
+        for a, b in self.inter_bonds:
+            if self.atom_residues[a] > self.atom_residues[b]:
+                a, b = b, a
+
+            if self.atom_residues[b] - self.atom_residues[a] == 1:
+                declarations[self.resi_uniq_ids[self.atom_residues[a]]].add(
+                    (self.atom_isomorphic_to[a], '+{}'.format(self.atom_names[b])))
+
+        return [sorted(d) for d in declarations]
+
+    def _resi_names(self) -> List[str]:
+        """Get the residue name of each atom"""
+
+        resi_names = ['X'] * len(self.symbols)
 
         for i, component in enumerate(self.uniq_residues):
-            resi_angs, resi_dihe = component.autogenerate_angles_dihedrals()
             for mp in self.resi_isomorphic_to[i]:
-                # assign resi name
                 for ai in mp.values():
-                    resi_names[ai] = 'RES{}'.format(i + 1)
+                    resi_names[ai] = self.uniq_resi_names[i]
+
+        return resi_names
+
+    def _gather_terms(
+        self,
+        width: int,
+        uniq_terms: List[List[tuple]],
+        inter_terms: List[tuple],
+        memory_budget: Optional[int] = None
+    ) -> Optional[NDArray[int]]:
+        """Gather the terms (e.g., angles, of `width` atoms) of all residues: the ones of each unique residue
+        (`uniq_terms`) are mapped to each of its copies, then `inter_terms` follow.
+
+        If a `memory_budget` (in bytes) is given and the result does not fit in it, it is stored in a (temporary)
+        memory-mapped file instead, and the copies are processed by chunks, so that the memory used stays within budget.
+        """
 
-                # add angles using mapping
-                angles.extend((mp[i], mp[j], mp[k]) for i, j, k in resi_angs)
-                dihedrals.extend((mp[i], mp[j], mp[k], mp[l]) for i, j, k, l in resi_dihe)
+        dtype = numpy.dtype(numpy.int32 if len(self.symbols) < 2 ** 31 else numpy.int64)
+        total = len(inter_terms) + sum(
+            len(terms) * len(self.resi_isomorphic_to[i]) for i, terms in enumerate(uniq_terms))
+
+        if total == 0:
+            return None
+
+        if memory_budget is not None and total * width * dtype.itemsize > memory_budget:
+            l_logger.info('storing {} terms of {} atoms in a memory-mapped file'.format(total, width))
+            result = numpy.memmap(tempfile.TemporaryFile(), dtype=dtype, mode='w+', shape=(total, width))
+        else:
+            result = numpy.empty((total, width), dtype=dtype)
+
+        offset = 0
+        for i, terms in enumerate(uniq_terms):
+            if len(terms) == 0:
+                continue
+
+            nodes = list(self.uniq_residues[i].subgraph.nodes)
+            local = dict((n, k) for k, n in enumerate(nodes))
+            local_terms = numpy.array([[local[n] for n in term] for term in terms])
+
+            copies = self.resi_isomorphic_to[i]
+            chunk_size = len(copies)
+            if memory_budget is not None:
+                chunk_size = max(1, memory_budget // ((len(nodes) + 2 * local_terms.size) * dtype.itemsize))
+
+            for begin in range(0, len(copies), chunk_size):
+                # map the atoms of the unique residue to the ones of each copy (one copy per row)
+                mapping = numpy.array([[mp[n] for n in nodes] for mp in copies[begin:begin + chunk_size]], dtype=dtype)
+                block = mapping[:, local_terms].reshape(-1, width)
+
+                result[offset:offset + block.shape[0]] = block
+                offset += block.shape[0]
+
+        if len(inter_terms) > 0:
+            result[offset:] = inter_terms
+
+        return result
+
+    def structure(
+        self,
+        seg_name: str = 'SYS',
+        memory_budget: Optional[int] = None,
+        hbonds: bool = False,
+        impropers: bool = False,
+        planarity: Optional[float] = None
+    ) -> Structure:
+        """
+        Get the corresponding structure.
+        Each unique set of connected components is considered as a residue.
+        If the angles or dihedrals do not fit within `memory_budget` (in bytes), they are stored in temporary
+        memory-mapped files (see `self._gather_terms()`).
+        If `hbonds` is set, hydrogen-bond donors and acceptors are also found (see `donors_acceptors()`).
+        If `impropers` is set, impropers are generated for atoms with three neighbors (planar ones only, if
+        `planarity` is given, see `self._gather_impropers()`).
+        """
+
+        uniq_angles = []
+        uniq_dihedrals = []
+
+        for i in range(len(self.uniq_residues)):
+            resi_angs, resi_dihe = self._angles_dihedrals(i)
+            uniq_angles.append(resi_angs)
+            uniq_dihedrals.append(resi_dihe)
+
+        inter_angles, inter_dihedrals = self._inter_angles_dihedrals()
+
+        bonds = numpy.array(self.g.edges)
+
+        donors = acceptors = None
+        if hbonds:
+            donors, acceptors = donors_acceptors(self.symbols, Adjacency.from_bonds(len(self.symbols), bonds))
+            donors = donors if donors.shape[0] > 0 else None
+            acceptors = acceptors if acceptors.shape[0] > 0 else None
 
         return Structure(
-            seg_names=[seg_name] * len(self.geometry),
-            atom_types=self.geometry.symbols,
+            seg_names=[seg_name] * len(self.symbols),
+            atom_types=self.atom_types,
             atom_names=self.atom_names,
+            charges=self.charges,
             resi_ids=self.resi_ids,
-            resi_names=resi_names,
-            masses=[ATOMIC_WEIGHTS[s] for s in self.geometry.symbols],
-            bonds=numpy.array(self.g.edges),
-            angles=numpy.array(angles) if len(angles) > 0 else None,
-            dihedrals=numpy.array(dihedrals) if len(dihedrals) > 0 else None
+            resi_names=self._resi_names(),
+            masses=self.masses,
+            bonds=bonds,
+            angles=self._gather_terms(3, uniq_angles, inter_angles, memory_budget),
+            dihedrals=self._gather_terms(4, uniq_dihedrals, inter_dihedrals, memory_budget),
+            impropers=self._gather_impropers(planarity, memory_budget) if impropers else None,
+            donors=donors,
+            acceptors=acceptors
         )
 
     def topologies(self) -> Topologies:
         """
         Get a set of topologies.
         Each unique set of independent components is converted into a residue.
+        Residues that match a template are taken from it (without the bonds to other residues, if any).
+        The bonds of the other residues to the next one (if any) are declared.
         """
 
-        uniq_elements = set(self.geometry.symbols)
+        masses = {}
+        declarations = []
+        uniq_declarations = self._declarations()
 
         residues = []
-        i = 0
-        for residue in self.uniq_residues:
-            i += 1
-            residues.append(ResidueTopology(
-                resi_name='RES{}'.format(i),
-                resi_charge=.0,
-                atom_types=[self.geometry.symbols[i] for i in residue.subgraph.nodes],
-                atom_names=[self.atom_names[i] for i in residue.subgraph.nodes],
-                atom_charges=[.0] * len(residue),
-                bonds=numpy.array(residue.subgraph.edges)
-            ))
+        for i, residue in enumerate(self.uniq_residues):
+            if self.uniq_templates[i] is not None:
+                template = self.uniq_templates[i][0]
+                for atom_type in template.atom_types:
+                    masses[atom_type] = self.templates.topologies.masses[atom_type]
+                residues.append(ResidueTopology(
+                    resi_name=template.resi_name,
+                    resi_charge=template.resi_charge,
+                    atom_types=template.atom_types,
+                    atom_names=template.atom_names,
+                    atom_charges=template.atom_charges,
+                    bonds=numpy.array([(a, b) for a, b in template.bonds if a >= 0 and b >= 0]).reshape(-1, 2)
+                ))
+            else:
+                nodes = list(residue.subgraph.nodes)
+                local = dict((ai, k) for k, ai in enumerate(nodes))
+                for ai in nodes:
+                    masses[self.atom_types[ai]] = self.masses[ai]
+
+                bonds = [(local[a], local[b]) for a, b in residue.subgraph.edges]
+                for ai, declaration in uniq_declarations[i]:
+                    if declaration not in declarations:
+                        declarations.append(declaration)
+                    bonds.append((local[ai], -declarations.index(declaration) - 1))
+
+                residues.append(ResidueTopology(
+                    resi_name=self.uniq_resi_names[i],
+                    resi_charge=round(sum(self.charges[ai] for ai in nodes), 6),
+                    atom_types=[self.atom_types[ai] for ai in nodes],
+                    atom_names=[self.atom_names[ai] for ai in nodes],
+                    atom_charges=[self.charges[ai] for ai in nodes],
+                    bonds=numpy.array(bonds).reshape(-1, 2)
+                ))
 
         return Topologies(
-            masses=dict((k, ATOMIC_WEIGHTS[k]) for k in uniq_elements),
+            masses=masses,
             autogenerate={('ANGLE', 'DIHE')},
             defaults={('FIRST', 'NONE'), ('LAST', 'NONE')},
+            declarations=declarations,
             residues=residues,
         )
 
-    def pdb(self) -> PDBGeometry:
-        resi_names = ['X'] * len(self.geometry)
 
-        # assign resi name
-        for i, component in enumerate(self.uniq_residues):
-            for mp in self.resi_isomorphic_to[i]:
-                for ai in mp.values():
-                    resi_names[ai] = 'RES{}'.format(i + 1)
+class GeometryAnalyzer(MolecularGraphAnalyzer):
+    """Analyze a geometry: bonds are guessed from the distances between atoms (see `self._guess_bonds()`), unless
+    they are given.
+
+    If the geometry is a `PDBGeometry` with residues, its residues (consecutive atoms with the same segment, residue
+    id and name) are used as is, rather than connected components.
+    Bonds are then only searched for within a residue or between adjacent residues, and residues with the same name
+    and atom names are matched atom by atom. The residue and atom names are kept (see `self._use_input_names()`).
+
+    If the geometry is periodic, give its (orthorhombic) `cell`: bonds are then guessed with the minimum image
+    convention, and the molecules are unwrapped in `self.pdb()`.
+    """
+
+    def __init__(
+        self,
+        geometry: Union[str, Geometry],
+        threshold: float = 1.1,
+        library: Optional[Union[Topologies, ResidueTemplates]] = None,
+        cache: Optional[ResidueCache] = None,
+        bonds: Optional[NDArray[int]] = None,
+        cell: Optional[NDArray[float]] = None
+    ):
+        self.cell = cell
+        self._unwrapped_positions = None
+
+        if type(geometry) is str:
+            with open(geometry) as f:
+                self.geometry = Geometry.from_xyz(f)
+        elif isinstance(geometry, Geometry):
+            self.geometry = geometry
+        else:
+            raise TypeError('geometry')
+
+        # create graph
+        self.g = networkx.Graph()
+        self.g.add_nodes_from((i, {'symbol': self.geometry.symbols[i]}) for i in range(len(self.geometry)))
 
+        partition = self._residue_partition()
+        self.has_residues = partition is not None
+
+        if bonds is not None:  # already known (e.g., from `BondSweep`)
+            self.g.add_edges_from(numpy.asarray(bonds).tolist())
+        elif partition is None:
+            self._guess_bonds(threshold)
+        else:
+            self._guess_residue_bonds(partition, threshold)
+
+        super().__init__(self.g, cache=cache, partition=partition)
+
+        if self.has_residues:
+            self._use_input_names(self.geometry.resi_names, self.geometry.atom_names)
+            self.resi_ids = list(self.geometry.resi_ids)
+
+        if library is not None:
+            self.templates = library if isinstance(library, ResidueTemplates) else ResidueTemplates(library)
+            self._match_templates(self.templates)
+
+    def _residue_partition(self) -> Optional[List[List[int]]]:
+        """Get the residues of the geometry, if any, as runs of consecutive atoms with the same segment, residue id
+        and name.
+        """
+
+        if not isinstance(self.geometry, PDBGeometry) or self.geometry.resi_ids is None or len(self.geometry) == 0:
+            return None
+
+        bounds = numpy.append(self.geometry.residue_starts(), len(self.geometry))
+
+        return [list(range(bounds[k], bounds[k + 1])) for k in range(bounds.shape[0] - 1)]
+
+    def _guess_bonds(self, threshold: float = 1.1):
+        """
+        Guess which atom are linked to which, from the distances between neighboring atoms (see `neighbor_pairs()`).
+        May lead to incorrect results for strange bonds (e.g., metalic)
+        """
+
+        l_logger.debug('assign bonds')
+        pairs, _ = neighbor_pairs(self.geometry.positions, self.geometry.symbols, threshold, self.cell)
+        self.g.add_edges_from(pairs.tolist())
+
+    def _guess_residue_bonds(self, partition: List[List[int]], threshold: float = 1.1):
+        """
+        Same as `self._guess_bonds()`, but only searched within a residue of `partition` or between two adjacent ones
+        (see `residue_neighbor_pairs()`).
+        """
+
+        l_logger.debug('assign bonds, within and between adjacent residues')
+
+        # residues are runs of consecutive atoms
+        pairs, _ = residue_neighbor_pairs(
+            self.geometry.positions,
+            self.geometry.symbols,
+            numpy.array([indices[0] for indices in partition], dtype=numpy.int64),
+            threshold,
+            self.cell
+        )
+
+        self.g.add_edges_from(pairs.tolist())
+
+    def _component_key(self, indices: List[int]) -> Optional[tuple]:
+        """Residues with the same name, atom names and elements, in the same order, and the same bonds, are the same.
+        """
+
+        if not self.has_residues or self.geometry.atom_names is None or self.geometry.resi_names is None:
+            return None
+
+        local = dict((ai, k) for k, ai in enumerate(indices))
+        adj = self.g.adj
+
+        return (
+            self.geometry.resi_names[indices[0]],
+            tuple((self.geometry.atom_names[ai], self.symbols[ai]) for ai in indices),
+            tuple((k, local[aj]) for k, ai in enumerate(indices) for aj in sorted(adj[ai]) if aj > ai and aj in local)
+        )
+
+    def _bucket_key(self, indices: List[int], subgraph: networkx.Graph) -> str:
+        """Residues with different names are never the same, if the geometry provides them"""
+
+        key = super()._bucket_key(indices, subgraph)
+
+        if self.has_residues and self.geometry.resi_names is not None:
+            key = '{}:{}'.format(self.geometry.resi_names[indices[0]], key)
+
+        return key
+
+    def _positions(self) -> Optional[NDArray[float]]:
+        return self.unwrapped_positions()
+
+    def unwrapped_positions(self) -> NDArray[float]:
+        """Get the positions, with the molecules unwrapped (if there is a cell, see `just_psf.periodic.unwrap()`).
+        They are computed once.
+        """
+
+        if self.cell is None:
+            return self.geometry.positions
+
+        if self._unwrapped_positions is None:
+            from just_psf.periodic import unwrap
+
+            self._unwrapped_positions = unwrap(
+                self.geometry.positions,
+                Adjacency.from_bonds(len(self.symbols), numpy.array(self.g.edges, dtype=numpy.int64).reshape(-1, 2)),
+                self.cell
+            )
+
+        return self._unwrapped_positions
+
+    def pdb(self) -> PDBGeometry:
         return PDBGeometry(
-            symbols=self.geometry.symbols,
-            positions=self.geometry.positions,
+            symbols=self.symbols,
+            positions=self.unwrapped_positions(),
+            seg_names=self.geometry.seg_names if isinstance(self.geometry, PDBGeometry) else None,
             resi_ids=self.resi_ids,
-            resi_names=resi_names,
+            resi_names=self._resi_names(),
             atom_names=self.atom_names,
         )
+
+
+class BondSweep:
+    """Explore the bonds of a geometry for many thresholds (see `GeometryAnalyzer`), up to `max_threshold`.
+    The neighbors are searched once, and their ratio of distance to summed covalent radii is kept (sorted), so that the
+    bonds for a given threshold are the first ones.
+    """
+
+    def __init__(
+        self,
+        geometry: Geometry,
+        max_threshold: float = 1.5,
+        library: Optional[Union[Topologies, ResidueTemplates]] = None,
+        cache: Optional[ResidueCache] = None
+    ):
+        self.geometry = geometry
+        self.max_threshold = max_threshold
+
+        self.library = library
+        if library is not None and not isinstance(library, ResidueTemplates):
+            self.library = ResidueTemplates(library)
+
+        self.cache = cache
+
+        pairs, ratios = neighbor_pairs(geometry.positions, geometry.symbols, max_threshold)
+
+        order = numpy.argsort(ratios, kind='stable')
+        self.pairs = pairs[order]
+        self.ratios = ratios[order]
+
+        self._analyzers = {}
+
+    def n_bonds(self, threshold: float) -> int:
+        assert threshold <= self.max_threshold
+        return int(numpy.searchsorted(self.ratios, threshold, side='left'))
+
+    def bonds(self, threshold: float) -> NDArray[int]:
+        """Get the bonds for `threshold` (sorted, as in `GeometryAnalyzer`)"""
+
+        bonds = self.pairs[:self.n_bonds(threshold)]
+        return bonds[numpy.lexsort((bonds[:, 1], bonds[:, 0]))]
+
+    def n_components(self, thresholds: Iterable[float]) -> List[int]:
+        """Get the number of connected components for each threshold.
+        Bonds are added by increasing ratio to a union-find structure, so that all thresholds together cost as much as
+        the largest one.
+        """
+
+        thresholds = list(thresholds)
+        parents = numpy.arange(len(self.geometry)).tolist()
+
+        def root(i: int) -> int:
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]  # path halving
+                i = parents[i]
+            return i
+
+        counts = [0] * len(thresholds)
+        n_components = len(self.geometry)
+        n_added = 0
+        pairs = self.pairs.tolist()
+
+        for k in sorted(range(len(thresholds)), key=lambda k: thresholds[k]):
+            n_bonds = self.n_bonds(thresholds[k])
+            for i, j in pairs[n_added:n_bonds]:
+                ri, rj = root(i), root(j)
+                if ri != rj:
+                    parents[ri] = rj
+                    n_components -= 1
+
+            n_added = max(n_added, n_bonds)
+            counts[k] = n_components
+
+        return counts
+
+    def analyzer(self, threshold: float) -> GeometryAnalyzer:
+        """Get the analyzer for `threshold`, which is shared by all thresholds that lead to the same bonds.
+        """
+
+        n_bonds = self.n_bonds(threshold)
+        if n_bonds not in self._analyzers:
+            self._analyzers[n_bonds] = GeometryAnalyzer(
+                self.geometry, bonds=self.bonds(threshold), library=self.library, cache=self.cache)
+
+        return self._analyzers[n_bonds]
+
+
+class StructureAnalyzer(MolecularGraphAnalyzer):
+    """Analyze an existing structure (e.g., read from a PSF): its bonds are used as is, so that no geometry (nor
+    distance) is needed.
+    The element of each atom is guessed from its mass (or, if not available, its type).
+
+    Unique residues keep their residue name, atom names, types and charges from the structure, as long as they are
+    consistent (i.e., all atoms belong to a single residue name, which is not already used by another unique
+    residue, and have distinct names).
+    """
+
+    def __init__(
+        self,
+        structure: Structure,
+        library: Optional[Union[Topologies, ResidueTemplates]] = None,
+        cache: Optional[ResidueCache] = None
+    ):
+        # prefetch columns
+        self._input_atom_names = list(structure.atom_names)
+        self._input_atom_types = list(structure.atom_types)
+        self._input_resi_names = list(structure.resi_names) if structure.resi_names is not None else None
+        self._input_charges = list(structure.charges) if structure.charges is not None else [.0] * len(structure)
+
+        symbols = guess_symbols(structure)
+
+        # create graph
+        g = networkx.Graph()
+        g.add_nodes_from((i, {'symbol': symbols[i]}) for i in range(len(structure)))
+        if structure.bonds is not None:
+            g.add_edges_from(structure.bonds.tolist())
+
+        super().__init__(g, cache=cache, masses=list(structure.masses) if structure.masses is not None else None)
+
+        self._use_input_names(
+            self._input_resi_names, self._input_atom_names, self._input_atom_types, self._input_charges)
+
+        if library is not None:
+            self.templates = library if isinstance(library, ResidueTemplates) else ResidueTemplates(library)
+            self._match_templates(self.templates)
+
+    def _component_key(self, indices: List[int]) -> Optional[tuple]:
+        """Components with the same atom names and types, in the same order, and the same bonds, are the same.
+        """
+
+        local = dict((ai, k) for k, ai in enumerate(indices))
+        adj = self.g.adj
+
+        return (
+            tuple((self._input_atom_names[ai], self._input_atom_types[ai]) for ai in indices),
+            tuple((k, local[aj]) for k, ai in enumerate(indices) for aj in sorted(adj[ai]) if aj > ai)
+        )
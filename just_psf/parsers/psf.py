@@ -1,8 +1,10 @@
+import array
 from typing import Optional
 import numpy
 from numpy.typing import NDArray
 
 from just_psf import logger
+from just_psf.columns import Column, CategoricalBuilder
 from just_psf.parsers import ParseError
 from just_psf.parsers.line import TokenType, LineParser
 from just_psf.structure import Structure
@@ -105,17 +107,26 @@ class PSFParser(LineParser):
         # check that all indices are within boundary
         N = len(atom_names)
 
-        def valid_sec_or_raise(name):
-            """If the section exists, check that all indices are in boundary"""
+        def valid_sec_or_raise(name, optional_second: bool = False):
+            """If the section exists, check that all indices are in boundary.
+            If `optional_second`, the second atom may be missing (0 in the file, -1 once read).
+            """
 
             if name in sections and sections[name] is not None:
+                if optional_second:
+                    sections[name][sections[name][:, 1] == -first_id, 1] = -1
+
                 nfail = sections[name][sections[name] >= N]
                 if len(nfail) > 0:
                     raise PSFParseError(self.current_token, 'error in section {}: indices too large: {}'.format(
                         name, ','.join(str(x) for x in (nfail + first_id))
                     ))
 
-                nfail = sections[name][sections[name] < 0]
+                is_invalid = sections[name] < 0
+                if optional_second:
+                    is_invalid[:, 1] = sections[name][:, 1] < -1
+
+                nfail = sections[name][is_invalid]
                 if len(nfail) > 0:
                     raise PSFParseError(self.current_token, 'error in section {}: indices too small: {}'.format(
                         name, ','.join(str(x) for x in (nfail + first_id))
@@ -125,8 +136,8 @@ class PSFParser(LineParser):
         valid_sec_or_raise('NTHETA')
         valid_sec_or_raise('NPHI')
         valid_sec_or_raise('NIMPHI')
-        valid_sec_or_raise('NDON')
-        valid_sec_or_raise('NACC')
+        valid_sec_or_raise('NDON', optional_second=True)
+        valid_sec_or_raise('NACC', optional_second=True)
 
         # return structure
         return Structure(
@@ -159,14 +170,15 @@ class PSFParser(LineParser):
         Format checked against `charmm/source/io/psfres.F90` (in c47b1).
         """
 
-        seg_names = []
-        resi_ids = []
-        resi_names = []
-        atom_names = []
-        atom_types = []
-        charges = []
-        masses = []
-        fixed = []
+        # store data column-wise, so that no Python object is kept per atom
+        seg_names = CategoricalBuilder()
+        resi_ids = array.array('l')
+        resi_names = CategoricalBuilder()
+        atom_names = CategoricalBuilder()
+        atom_types = CategoricalBuilder()
+        charges = array.array('d')
+        masses = array.array('d')
+        fixed = array.array('b')
 
         atom_parsers = {
             'STANDARD': lambda li:
@@ -278,7 +290,17 @@ class PSFParser(LineParser):
         if i != n:
             raise PSFParseError(self.current_token, 'not enough atoms, {} expected, got {}'.format(n, i))
 
-        return first_id, seg_names, resi_ids, resi_names, atom_names, atom_types, charges, masses, fixed
+        return (
+            first_id,
+            seg_names.column(),
+            Column(resi_ids, numpy.int32),
+            resi_names.column(),
+            atom_names.column(),
+            atom_types.column(),
+            Column(charges, numpy.float64),
+            Column(masses, numpy.float64),
+            Column(fixed, bool)
+        )
 
     def parse_indices(
         self,
@@ -292,7 +314,7 @@ class PSFParser(LineParser):
         There are `elements_per` elements per line, written using `intsize` characters.
         """
 
-        atm_ids = numpy.ndarray((n * indices_per, ), dtype=numpy.int64)
+        atm_ids = numpy.ndarray((n * indices_per, ), dtype=numpy.int32)
         i = 0
         remaining = n
 
@@ -313,7 +335,7 @@ class PSFParser(LineParser):
                 raise PSFParseError(self.current_token, 'incorrect number of indices, expected {}'.format(to_read))
 
             try:
-                atm_ids[i:i + to_read] = numpy.int64(
+                atm_ids[i:i + to_read] = numpy.int32(
                     tuple(self.current_token.value[j * intsize:(j + 1) * intsize] for j in range(to_read)))
             except ValueError:
                 raise PSFParseError(self.current_token, 'unable to parse indices')
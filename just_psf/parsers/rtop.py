@@ -1,5 +1,7 @@
 import io
-from typing import Iterator, TextIO, Optional, Callable, List, Tuple, Set, Union
+import json
+import os
+from typing import Iterator, TextIO, Optional, Callable, List, Tuple, Set, Union, Dict
 from enum import Enum, unique
 
 import numpy
@@ -56,45 +58,54 @@ class RTopParser:
     + https://www.charmm-gui.org/?doc=lecture&module=molecules_and_topology&lesson=2
     """
 
-    def __init__(self, inp: Union[TextIO, str]):
-        if isinstance(inp, io.TextIOBase):
-            self.input = inp.read()  # TODO: is it possible to stream the result like PSF?
-        else:
-            self.input = inp
+    def __init__(self, inp: Union[TextIO, str], first_line: int = 1):
+        if isinstance(inp, str):
+            inp = io.StringIO(inp)
+
+        # the input is streamed, line per line
+        self.source = inp
+        self.buffer = ''
 
         self.current_token: Optional[Token] = None
-        self.current_line = 1
+        self.current_line = first_line
         self.position = 0
 
         self.next()
 
     def tokenize(self) -> Iterator[Token]:
-        while self.position < len(self.input):
+        while True:
+            if self.position >= len(self.buffer):  # fetch next line
+                self.buffer = self.source.readline()
+                self.position = 0
+
+                if self.buffer == '':
+                    break
+
             start = self.position
             line_start = self.current_line
 
-            if self.input[start] in SPACES:  # skip spaces
+            if self.buffer[start] in SPACES:  # skip spaces
                 self.position = self._skip_if(predicate=lambda x: x in SPACES)
-            elif self.input[start] in NLS:
+            elif self.buffer[start] in NLS:
                 self.position += 1
                 self.current_line += 1
-                yield Token(TokenType.NL, self.input[start:self.position], line_start)
+                yield Token(TokenType.NL, self.buffer[start:self.position], line_start)
             else:
-                if self.input[start] == '*' and (start == 0 or self.input[start - 1] in NLS):
+                if self.buffer[start] == '*' and (start == 0 or self.buffer[start - 1] in NLS):
                     self.position = self._skip_if(predicate=lambda x: x not in NLS)
-                    yield Token(TokenType.TITLEL, self.input[start:self.position], line_start)
-                elif self.input[start] == COMMENT:  # skip comment
+                    yield Token(TokenType.TITLEL, self.buffer[start:self.position], line_start)
+                elif self.buffer[start] == COMMENT:  # skip comment
                     self.position = self._skip_if(predicate=lambda x: x not in NLS)
                 else:
                     self.position = self._skip_if(predicate=lambda x: x not in SPACES and x not in NLS)
-                    yield Token(TokenType.WORD, self.input[start:self.position], line_start)
+                    yield Token(TokenType.WORD, self.buffer[start:self.position], line_start)
 
-        yield Token(TokenType.EOF, '\0', self.position)
+        yield Token(TokenType.EOF, '\0', self.current_line)
 
     def _skip_if(self, predicate: Callable) -> int:
-        """Go to the next position while `predicate` is true"""
+        """Go to the next position (in the current line) while `predicate` is true"""
         end = self.position + 1
-        while end < len(self.input) and predicate(self.input[end]):
+        while end < len(self.buffer) and predicate(self.buffer[end]):
             end += 1
 
         return end
@@ -155,7 +166,21 @@ class RTopParser:
 
     def topologies(self) -> Topologies:
         """
-        TOPOLOGY := HEADER DECLS RESIDUE* END
+        TOPOLOGY := HEADER RESIDUE* END
+        """
+
+        l_logger.debug('Parsing topologies')
+
+        topologies = self.header()
+        topologies.residues.extend(self.iter_residues(topologies))
+
+        l_logger.debug('Done')
+
+        return topologies
+
+    def header(self) -> Topologies:
+        """Parse the header, and return the corresponding (residue-less) topologies.
+
         HEADER := TITLE VERSION (MASS | DECL | DEFA | AUTO)*
         MASS := 'MASS' INT STRING FLOAT WORD? NL
         DECL := 'DECL' WORD NL
@@ -163,8 +188,6 @@ class RTopParser:
         AUTO := 'AUTO' WORD* NL
         """
 
-        l_logger.debug('Parsing topologies')
-
         top_masses = {}
         top_autogenerate = set()
         top_decls = []
@@ -214,11 +237,23 @@ class RTopParser:
                 self.eat(TokenType.NL)
                 self.next_non_empty()
 
-        # residues
-        allowed_types = set(top_masses.keys())
-        residues = []
+        return Topologies(
+            masses=top_masses,
+            autogenerate=top_autogenerate,
+            defaults=top_defaults,
+            declarations=top_decls,
+        )
+
+    def iter_residues(self, header: Topologies) -> Iterator[ResidueTopology]:
+        """Lazily parse the residues that follow the header (see `self.header()`), up to the final `END`.
+        Atom types and declarations are checked against `header`.
+
+        RESIDUES := RESIDUE* END
+        """
+
+        allowed_types = set(header.masses.keys())
         while self.current_token.type == TokenType.WORD and self.current_token.value[:4] == 'RESI':
-            residues.append(self.residue(allowed_types, top_decls))
+            yield self.residue(allowed_types, header.declarations)
 
         # normally, there is nothing more:
         end_keyword = self.word()
@@ -228,16 +263,6 @@ class RTopParser:
         self.next_non_empty()
         self.eat(TokenType.EOF)
 
-        l_logger.debug('Done')
-
-        return Topologies(
-            masses=top_masses,
-            autogenerate=top_autogenerate,
-            defaults=top_defaults,
-            declarations=top_decls,
-            residues=residues
-        )
-
     def title(self) -> List[str]:
         """
         TITLE := ((TITLEL NL)* '*' NL)?
@@ -343,3 +368,192 @@ class RTopParser:
             atom_charges=atom_charges,
             bonds=numpy.array(bonds).reshape((-1, 2))
         )
+
+
+class RTopIndex:
+    """Index over a RTF file, which maps the name of each residue to the position (in bytes) of its `RESI` block
+    (as well as the one of the header), so that a residue can be parsed without parsing the whole file.
+
+    The number of atoms of each residue (its `ATOM` lines) is also counted, so that candidates for a molecule can be
+    found without parsing (see `just_psf.geometry_analyzer.ResidueTemplates`).
+
+    The index can be saved (as JSON) and reloaded, as long as the RTF file does not change.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        header: Tuple[int, int, int],
+        residues: Dict[str, Tuple[int, int, int]],
+        size: int = -1,
+        mtime: float = -1,
+        n_atoms: Optional[Dict[str, int]] = None,
+    ):
+        # each block is stored as `(start, end, first_line)`
+        self.path = str(path)
+        self.header = tuple(header)
+        self.residues = dict((k, tuple(v)) for k, v in residues.items())
+        self.n_atoms = n_atoms
+        self.size = size
+        self.mtime = mtime
+
+    def __len__(self) -> int:
+        return len(self.residues)
+
+    def __contains__(self, resi_name: str) -> bool:
+        return resi_name in self.residues
+
+    @classmethod
+    def build(cls, path: str) -> 'RTopIndex':
+        """Scan the RTF file at `path` (without parsing it) to find the header and each `RESI` block.
+        A block ends with the next `RESI`, `PRES` or `END` keyword.
+        """
+
+        l_logger.debug('Indexing `{}`'.format(path))
+
+        header = None
+        residues = {}
+        n_atoms = {}
+
+        current = None  # (resi_name, start, first_line)
+        current_n_atoms = 0
+
+        def close_block(end: int):
+            resi_name, start, line = current
+            if resi_name in residues:
+                l_logger.warning('residue `{}` is defined more than once, keep the first one'.format(resi_name))
+            else:
+                residues[resi_name] = (start, end, line)
+                n_atoms[resi_name] = current_n_atoms
+
+        with open(path, 'rb') as f:
+            position = 0
+            for i, line in enumerate(f):
+                words = line.split(None, 2)
+                keyword = words[0][:4].decode('utf-8', errors='replace') if len(words) > 0 else ''
+
+                if keyword in ['RESI', 'PRES', 'END']:
+                    if header is None:
+                        header = (0, position, 1)
+                    if current is not None:
+                        close_block(position)
+                        current = None
+
+                    if keyword == 'RESI' and len(words) > 1:
+                        current = (words[1].decode('utf-8', errors='replace'), position, i + 1)
+                        current_n_atoms = 0
+                elif keyword == 'ATOM':
+                    current_n_atoms += 1
+
+                position += len(line)
+
+            if header is None:
+                header = (0, position, 1)
+
+            if current is not None:
+                close_block(position)
+
+        stat = os.stat(path)
+
+        l_logger.debug('... Got {} residue(s)'.format(len(residues)))
+
+        return cls(path, header, residues, size=stat.st_size, mtime=stat.st_mtime, n_atoms=n_atoms)
+
+    def is_stale(self) -> bool:
+        """Check whether the RTF file was modified since the index was built"""
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+
+        return stat.st_size != self.size or stat.st_mtime != self.mtime
+
+    def to_json(self, f: TextIO):
+        json.dump({
+            'path': self.path,
+            'size': self.size,
+            'mtime': self.mtime,
+            'header': self.header,
+            'residues': self.residues,
+            'n_atoms': self.n_atoms
+        }, f)
+
+    @classmethod
+    def from_json(cls, f: TextIO) -> 'RTopIndex':
+        data = json.load(f)
+        return cls(
+            data['path'], data['header'], data['residues'], size=data['size'], mtime=data['mtime'],
+            n_atoms=data.get('n_atoms')
+        )
+
+    @classmethod
+    def from_file(cls, path: str, index_path: Optional[str] = None) -> 'RTopIndex':
+        """Load the index from `index_path` if it exists and is up to date, otherwise build it (and save it to
+        `index_path`, if any).
+        """
+
+        if index_path is not None and os.path.exists(index_path):
+            with open(index_path) as f:
+                index = cls.from_json(f)
+
+            if os.path.abspath(index.path) == os.path.abspath(path) and not index.is_stale() \
+                    and index.n_atoms is not None:
+                return index
+
+            l_logger.info('index `{}` is out of date, rebuild it'.format(index_path))
+
+        index = cls.build(path)
+
+        if index_path is not None:
+            with open(index_path, 'w') as f:
+                index.to_json(f)
+
+        return index
+
+    def read_block(self, block: Tuple[int, int, int]) -> str:
+        start, end, _ = block
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8')
+
+    def topologies(self) -> 'IndexedTopologies':
+        """Parse the header, and get topologies in which residues are parsed on demand
+        """
+
+        header = RTopParser(self.read_block(self.header), first_line=self.header[2]).header()
+        return IndexedTopologies(self, header)
+
+
+class IndexedTopologies(Topologies):
+    """Topologies backed by a `RTopIndex`, in which a residue is only parsed when requested (through
+    `self.residue()`). Then, `self.residues` only contains the residues that were requested so far.
+    """
+
+    def __init__(self, index: RTopIndex, header: Topologies):
+        super().__init__(
+            masses=header.masses,
+            defaults=header.defaults,
+            autogenerate=header.autogenerate,
+            declarations=header.declarations
+        )
+
+        self.index = index
+        self._allowed_types = set(self.masses.keys())
+        self._parsed = {}
+
+    def resi_names(self) -> List[str]:
+        return list(self.index.residues.keys())
+
+    def residue(self, resi_name: str) -> ResidueTopology:
+        if resi_name not in self._parsed:
+            block = self.index.residues[resi_name]  # raise KeyError if not found
+
+            l_logger.debug('Parsing residue `{}` from `{}`'.format(resi_name, self.index.path))
+            parser = RTopParser(self.index.read_block(block), first_line=block[2])
+            residue = parser.residue(self._allowed_types, self.declarations)
+
+            self._parsed[resi_name] = residue
+            self.residues.append(residue)
+
+        return self._parsed[resi_name]
@@ -0,0 +1,90 @@
+"""
+Periodic boundary conditions: minimum image convention, and unwrapping of the molecules split across the box.
+A cell is given either by its 3 lengths (orthorhombic box) or by its 3 lattice vectors (as rows of a 3x3 matrix).
+"""
+
+import numpy
+from numpy.typing import NDArray
+
+from just_psf import logger
+from just_psf.adjacency import Adjacency
+
+
+l_logger = logger.getChild(__name__)
+
+
+def as_lattice(cell: NDArray[float]) -> NDArray[float]:
+    """Get the lattice vectors (as rows) of `cell`"""
+
+    cell = numpy.asarray(cell, dtype=float)
+
+    if cell.shape == (3, ):
+        return numpy.diag(cell)
+    elif cell.shape == (3, 3):
+        return cell
+    else:
+        raise ValueError('a cell is given by 3 lengths or 3 lattice vectors, got shape {}'.format(cell.shape))
+
+
+def box_lengths(cell: NDArray[float]) -> NDArray[float]:
+    """Get the lengths of `cell`, which should be orthorhombic"""
+
+    lattice = as_lattice(cell)
+    if numpy.count_nonzero(lattice - numpy.diag(numpy.diag(lattice))) > 0:
+        raise ValueError('cell should be orthorhombic')
+
+    return numpy.diag(lattice)
+
+
+def minimum_image(vectors: NDArray[float], cell: NDArray[float]) -> NDArray[float]:
+    """Get the shortest periodic image of each of `vectors` (a (..., 3) array), e.g., differences of positions.
+    For a non-orthorhombic cell, this is done in fractional coordinates, which is exact as long as the vectors are
+    small compared to the cell.
+    """
+
+    lattice = as_lattice(cell)
+
+    fractional = vectors @ numpy.linalg.inv(lattice)
+    fractional -= numpy.round(fractional)
+
+    return fractional @ lattice
+
+
+def unwrap(positions: NDArray[float], adjacency: Adjacency, cell: NDArray[float]) -> NDArray[float]:
+    """Get the positions so that no molecule (connected component of `adjacency`) is split across the box: each
+    bonded atom is placed at the minimum image of its bond with the atom it was reached from.
+
+    The bond graph is walked breadth-first from the first atom of each molecule (which stays in place), all molecules
+    at once, one level at a time.
+    """
+
+    assert positions.shape == (len(adjacency), 3)
+
+    result = numpy.array(positions, dtype=float)
+
+    _, roots = numpy.unique(adjacency.connected_components(), return_index=True)
+
+    visited = numpy.zeros(len(adjacency), dtype=bool)
+    visited[roots] = True
+    frontier = roots
+
+    n_levels = 0
+    while frontier.shape[0] > 0:
+        sources, neighbors = adjacency.expand(frontier)
+
+        is_new = ~visited[neighbors]
+        sources, neighbors = sources[is_new], neighbors[is_new]
+
+        # an atom might be reached from many others: any one of them will do
+        neighbors, first = numpy.unique(neighbors, return_index=True)
+        sources = sources[first]
+
+        result[neighbors] = result[sources] + minimum_image(positions[neighbors] - positions[sources], cell)
+
+        visited[neighbors] = True
+        frontier = neighbors
+        n_levels += 1
+
+    l_logger.debug('unwrapped {} molecule(s) in {} level(s)'.format(roots.shape[0], n_levels))
+
+    return result
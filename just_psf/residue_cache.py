@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import time
+from typing import List
+
+import numpy
+from numpy.typing import NDArray
+
+from just_psf import logger
+
+
+l_logger = logger.getChild(__name__)
+
+
+class CachedResidue:
+    """A residue as stored in the cache, i.e., its atoms (in canonical order) and the bonds, angles and dihedrals
+    between them.
+    """
+
+    def __init__(self, symbols: List[str], bonds: NDArray[int], angles: NDArray[int], dihedrals: NDArray[int]):
+        self.symbols = symbols
+        self.bonds = numpy.asarray(bonds, dtype=numpy.int32).reshape(-1, 2)
+        self.angles = numpy.asarray(angles, dtype=numpy.int32).reshape(-1, 3)
+        self.dihedrals = numpy.asarray(dihedrals, dtype=numpy.int32).reshape(-1, 4)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+
+class ResidueCache:
+    """A persistent (SQLite) cache of residues, shared across runs, keyed by a hash of their molecular graph.
+    Different residues may share the same key, so the cache returns all of them.
+
+    At most `max_entries` residues are kept: the least recently used ones are evicted first.
+    Use `path=':memory:'` for a cache that only lives as long as the object.
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, path: str = ':memory:', max_entries: int = 1000):
+        self.path = str(path)
+        self.max_entries = max_entries
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS residues ('
+            'id INTEGER PRIMARY KEY, key TEXT, symbols TEXT, bonds BLOB, angles BLOB, dihedrals BLOB, last_used REAL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS residues_key ON residues (key)')
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM residues').fetchone()[0]
+
+    def __enter__(self) -> 'ResidueCache':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key: str) -> List[CachedResidue]:
+        """Get the residues stored under `key` (and mark them as recently used)
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT id, symbols, bonds, angles, dihedrals FROM residues WHERE key = ?', (key, )).fetchall()
+
+            if len(rows) > 0:
+                self.connection.executemany(
+                    'UPDATE residues SET last_used = ? WHERE id = ?', ((time.time(), row[0]) for row in rows))
+                self.connection.commit()
+
+        return [
+            CachedResidue(
+                symbols=symbols.split(),
+                bonds=numpy.frombuffer(bonds, dtype=numpy.int32),
+                angles=numpy.frombuffer(angles, dtype=numpy.int32),
+                dihedrals=numpy.frombuffer(dihedrals, dtype=numpy.int32),
+            ) for _, symbols, bonds, angles, dihedrals in rows
+        ]
+
+    def put(self, key: str, residue: CachedResidue):
+        """Store `residue` under `key`, then evict the least recently used residues if needed
+        """
+
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO residues (key, symbols, bonds, angles, dihedrals, last_used) VALUES (?, ?, ?, ?, ?, ?)', (
+                    key,
+                    ' '.join(residue.symbols),
+                    residue.bonds.tobytes(),
+                    residue.angles.tobytes(),
+                    residue.dihedrals.tobytes(),
+                    time.time()
+                ))
+
+            cursor = self.connection.execute(
+                'DELETE FROM residues WHERE id IN '
+                '(SELECT id FROM residues ORDER BY last_used DESC, id DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries, ))
+
+            if cursor.rowcount > 0:
+                l_logger.debug('evicted {} residue(s) from cache'.format(cursor.rowcount))
+
+            self.connection.commit()
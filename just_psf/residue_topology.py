@@ -70,6 +70,21 @@ class Topologies:
         self.autogenerate = autogenerate if autogenerate is not None else set()
         self.declarations = declarations if declarations is not None else []
 
+    def resi_names(self) -> List[str]:
+        """Get the name of all residues"""
+
+        return [residue.resi_name for residue in self.residues]
+
+    def residue(self, resi_name: str) -> ResidueTopology:
+        """Get a residue by its name. Raise `KeyError` if no such residue exists.
+        """
+
+        for residue in self.residues:
+            if residue.resi_name == resi_name:
+                return residue
+
+        raise KeyError(resi_name)
+
     def as_rtop(self, version: int = 19) -> str:
         r = ('* Generated by `{}.Topologies.as_rtop()`\n*\n19 1\n\n').format(__name__)
 
@@ -82,12 +97,12 @@ class Topologies:
         # defaults
         if len(self.defaults) > 0:
             r += 'DEFA'
-            for default in self.defaults:
+            for default in sorted(self.defaults):
                 r += ' {} {}'.format(*default)
             r += '\n'
 
         # autogenerate
-        for autogen in self.autogenerate:
+        for autogen in sorted(self.autogenerate):
             r += 'AUTO {}\n'.format(' '.join(autogen))
 
         # decls
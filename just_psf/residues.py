@@ -0,0 +1,103 @@
+"""
+Per-residue aggregates (total charge, center of mass, formula, bounding box), computed with segmented reductions.
+A residue is a run of consecutive atoms with the same segment, residue id and residue name (as in a PSF or PDB file),
+so that it is given by the index of its first atom (see `residue_starts()`), and results are indexed by residue.
+"""
+
+from typing import Iterable, List, Optional, Any
+
+import numpy
+from numpy.typing import NDArray
+
+from just_psf.columns import CategoricalColumn
+
+
+def residue_starts(n: int, columns: Iterable[Optional[Any]]) -> NDArray[int]:
+    """Get the index of the first atom of each residue, i.e., where one of the (per-atom) `columns` changes
+    (`None` columns are ignored)
+    """
+
+    if n == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+
+    is_start = numpy.zeros(n, dtype=bool)
+    is_start[0] = True
+
+    for column in columns:
+        if column is not None:
+            values = column.codes if isinstance(column, CategoricalColumn) else numpy.asarray(column)
+            is_start[1:] |= values[1:] != values[:-1]
+
+    return numpy.flatnonzero(is_start)
+
+
+def residue_indices(n: int, starts: NDArray[int]) -> NDArray[int]:
+    """Get the residue of each atom"""
+
+    return numpy.repeat(numpy.arange(starts.shape[0]), numpy.diff(numpy.append(starts, n)))
+
+
+def residue_sums(values: NDArray, starts: NDArray[int]) -> NDArray:
+    """Sum `values` (per atom, along the first axis) over each residue"""
+
+    values = numpy.asarray(values)
+    if starts.shape[0] == 0:
+        return numpy.zeros((0, *values.shape[1:]), dtype=values.dtype)
+
+    return numpy.add.reduceat(values, starts, axis=0)
+
+
+def centers_of_mass(
+    positions: NDArray[float], masses: Optional[NDArray[float]], starts: NDArray[int]
+) -> NDArray[float]:
+    """Get the center of mass of each residue, as a (R, 3) array (the geometric center if there is no `masses`)"""
+
+    if masses is None:
+        masses = numpy.ones(positions.shape[0])
+
+    masses = numpy.asarray(masses, dtype=float)
+    return residue_sums(positions * masses[:, numpy.newaxis], starts) / residue_sums(masses, starts)[:, numpy.newaxis]
+
+
+def bounding_boxes(positions: NDArray[float], starts: NDArray[int]) -> NDArray[float]:
+    """Get the bounding box of each residue, as a (R, 2, 3) array, `[minimum, maximum]`"""
+
+    if starts.shape[0] == 0:
+        return numpy.zeros((0, 2, 3))
+
+    return numpy.stack([
+        numpy.minimum.reduceat(positions, starts, axis=0),
+        numpy.maximum.reduceat(positions, starts, axis=0)
+    ], axis=1)
+
+
+def formulas(symbols: List[str], starts: NDArray[int]) -> List[str]:
+    """Get the formula of each residue, in Hill order (C, then H, then the others alphabetically, or all of them
+    alphabetically if there is no carbon).
+    Elements are counted by residue at once, and each distinct formula is only written once.
+    """
+
+    if starts.shape[0] == 0:
+        return []
+
+    elements, codes = numpy.unique(numpy.asarray(symbols, dtype=str), return_inverse=True)
+    residues = residue_indices(len(symbols), starts)
+
+    counts = numpy.bincount(
+        residues * elements.shape[0] + codes, minlength=starts.shape[0] * elements.shape[0]
+    ).reshape(starts.shape[0], elements.shape[0])
+
+    elements = elements.tolist()
+    order = sorted(range(len(elements)), key=lambda k: elements[k])
+    hill_order = [elements.index(e) for e in ('C', 'H') if e in elements]
+    hill_order += [k for k in order if k not in hill_order]
+
+    uniq_counts, inverse = numpy.unique(counts, axis=0, return_inverse=True)
+
+    uniq_formulas = []
+    for row in uniq_counts.tolist():
+        keys = hill_order if row[hill_order[0]] > 0 and elements[hill_order[0]] == 'C' else order
+        uniq_formulas.append(''.join(
+            '{}{}'.format(elements[k], row[k] if row[k] > 1 else '') for k in keys if row[k] > 0))
+
+    return [uniq_formulas[k] for k in inverse.reshape(-1).tolist()]
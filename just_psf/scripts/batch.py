@@ -0,0 +1,164 @@
+"""
+Common tools for the scripts: reading inputs and processing many of them at once (batch mode).
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import os
+import pathlib
+import sys
+from typing import List, TextIO, Callable, Any, Optional, Dict
+
+from just_psf import logger
+from just_psf.geometry import Geometry, PDBGeometry
+
+
+l_logger = logger.getChild(__name__)
+
+
+def read_geometry(f: TextIO) -> Geometry:
+    """Read a geometry, from a PDB file if its name ends with `.pdb`, from a XYZ file otherwise"""
+
+    if getattr(f, 'name', '').lower().endswith('.pdb'):
+        return PDBGeometry.from_pdb(f)
+
+    return Geometry.from_xyz(f)
+
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """Expand the inputs: `@path` is a manifest file (one input per line, empty lines and lines starting with `#`
+    are ignored), and an input containing a wildcard is a glob pattern (matches are sorted).
+    """
+
+    expanded = []
+
+    for inp in inputs:
+        if inp.startswith('@'):
+            with open(inp[1:]) as f:
+                expanded.extend(line.strip() for line in f if line.strip() and not line.strip().startswith('#'))
+        elif glob.has_magic(inp):
+            matches = sorted(glob.glob(inp))
+            if len(matches) == 0:
+                l_logger.warning('no file matches `{}`'.format(inp))
+            expanded.extend(matches)
+        else:
+            expanded.append(inp)
+
+    return expanded
+
+
+def add_arguments(parser: argparse.ArgumentParser, help_input: str):
+    """Add the input(s) and output(s) arguments"""
+
+    parser.add_argument(
+        'infile', nargs='+', help='{} (use a glob pattern or `@manifest` to process many files)'.format(help_input))
+    parser.add_argument('-o', '--output', help='output (if there is a single input)')
+    parser.add_argument('-d', '--output-dir', help='output directory, required if there are many inputs')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes (if there are many inputs)')
+
+
+def is_batch(args: argparse.Namespace) -> bool:
+    """Whether there are (possibly) many inputs, or an output directory"""
+
+    return len(args.infile) > 1 or glob.has_magic(args.infile[0]) or args.infile[0].startswith('@') \
+        or args.output_dir is not None
+
+
+# context of the current (worker) process, obtained by `setup()`
+_context = None
+
+
+def _init_worker(setup: Callable[[argparse.Namespace], Any], args: argparse.Namespace):
+    global _context
+    _context = setup(args)
+
+
+def _process(
+    convert: Callable[[Any, TextIO, Dict[str, TextIO]], None], inp: str, outs: Dict[str, str]
+) -> Optional[str]:
+    """Convert `inp` into `outs`, and return the error message, if any"""
+
+    try:
+        with open(inp) as f, contextlib.ExitStack() as stack:
+            convert(_context, f, dict((suffix, stack.enter_context(open(out, 'w'))) for suffix, out in outs.items()))
+    except Exception as e:
+        for out in outs.values():
+            if os.path.exists(out):
+                os.remove(out)
+
+        return '{}: {}'.format(type(e).__name__, e)
+
+    return None
+
+
+def run(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    setup: Callable[[argparse.Namespace], Any],
+    convert: Callable[[Any, TextIO, Dict[str, TextIO]], None],
+    outputs: Dict[str, Optional[str]]
+) -> int:
+    """Run `convert(context, infile, outfiles)` on every input, where `context` is obtained once per process by
+    `setup(args)` and `outfiles` is a dictionary of opened output files, with the same keys (suffixes, e.g.,
+    `.psf`) as `outputs`.
+
+    With a single input (and no output directory), the outputs go to the path given in `outputs` (or the standard
+    output, for at most one of them) and errors are raised.
+    Otherwise, the outputs go to the output directory (with the name of the input and their suffix), and errors are
+    reported per file. In that case, both `setup` and `convert` should be defined at the module level, so that they
+    can be used by other processes.
+    Return the number of failures.
+    """
+
+    if not is_batch(args):
+        if sum(1 for path in outputs.values() if path is None) > 1:
+            parser.error('at most one output can be the standard output, use `-o`')
+
+        context = setup(args)
+
+        with (contextlib.nullcontext(sys.stdin) if args.infile[0] == '-' else open(args.infile[0])) as f, \
+                contextlib.ExitStack() as stack:
+            convert(context, f, dict(
+                (suffix, stack.enter_context(contextlib.nullcontext(sys.stdout) if path is None else open(path, 'w')))
+                for suffix, path in outputs.items()
+            ))
+
+        return 0
+
+    # batch mode
+    if args.output_dir is None:
+        parser.error('many inputs require an output directory (`-d`)')
+
+    if any(path is not None for path in outputs.values()):
+        parser.error('output paths cannot be used with many inputs, use `-d` instead')
+
+    inputs = expand_inputs(args.infile)
+    outs = [
+        dict((suffix, os.path.join(args.output_dir, pathlib.Path(inp).stem + suffix)) for suffix in outputs)
+        for inp in inputs
+    ]
+
+    if len(set(pathlib.Path(inp).stem for inp in inputs)) != len(inputs):
+        parser.error('different inputs would have the same output (same name in different directories?)')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.jobs > 1 and len(inputs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=args.jobs, initializer=_init_worker, initargs=(setup, args)) as executor:
+            errors = list(executor.map(_process, [convert] * len(inputs), inputs, outs, chunksize=8))
+    else:
+        _init_worker(setup, args)
+        errors = [_process(convert, inp, out) for inp, out in zip(inputs, outs)]
+
+    failures = 0
+    for inp, error in zip(inputs, errors):
+        if error is not None:
+            failures += 1
+            l_logger.error('cannot process `{}`: {}'.format(inp, error))
+
+    l_logger.info('processed {} file(s), {} failure(s)'.format(len(inputs), failures))
+
+    return failures
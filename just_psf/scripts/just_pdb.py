@@ -1,27 +1,49 @@
 """
 "Just get me a topology, for god’s sake!"
 Create a Protein Data Bank (PDB) file, based on the distance matrix.
+With `--cell`, the geometry is periodic: molecules that are split across the box are unwrapped.
 """
 
 import argparse
+import logging
 import sys
+from typing import TextIO, Dict
 
-from just_psf.geometry import Geometry
-from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.scripts import batch
+
+
+def setup(args: argparse.Namespace) -> dict:
+    from just_psf.parsers.rtop import RTopParser
+
+    library = None
+    if args.library:
+        from just_psf.geometry_analyzer import ResidueTemplates
+
+        with open(args.library) as f:
+            library = ResidueTemplates(RTopParser(f).topologies())
+
+    return {'library': library, 'cell': getattr(args, 'cell', None)}
+
+
+def convert(context: dict, infile: TextIO, outfiles: Dict[str, TextIO]):
+    from just_psf.geometry_analyzer import GeometryAnalyzer
+
+    geometry = batch.read_geometry(infile)
+    GeometryAnalyzer(geometry, library=context['library'], cell=context['cell']).pdb().to_pdb(outfiles['.pdb'])
 
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument('infile', type=argparse.FileType('r'), help='input geometry')
-    parser.add_argument('-o', '--output', type=argparse.FileType('w'), help='output', default=sys.stdout)
+    batch.add_arguments(parser, 'input geometry (XYZ or PDB)')
+    parser.add_argument('-l', '--library', help='residue topologies (RTF) to be used as templates')
+    parser.add_argument(
+        '--cell', type=float, nargs=3, metavar=('A', 'B', 'C'), help='lengths of the (orthorhombic) periodic box')
 
     args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
 
-    # read file
-    geometry = Geometry.from_xyz(args.infile)
-
-    # make topology
-    GeometryAnalyzer(geometry).pdb().to_pdb(args.output)
+    if batch.run(parser, args, setup, convert, {'.pdb': args.output}) > 0:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,28 +1,134 @@
 """
 "Just get me a topology, for god’s sake!"
 Create a Protein Structure File (PSF), based on the distance matrix.
+The corresponding PDB and RTF can be created at the same time, from the same analysis.
+Use `just-psf serve SOCKET` to start a server, and `--socket SOCKET` to send the inputs to it.
 """
 
 import argparse
+import logging
+import os
+import pathlib
 import sys
+from typing import TextIO, Dict, Optional
 
-from just_psf.geometry import Geometry
-from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.scripts import batch
+
+
+def structure_options(args: argparse.Namespace) -> dict:
+    """Get the options of `GeometryAnalyzer.structure()`"""
+
+    return {
+        'hbonds': getattr(args, 'hbonds', False),
+        'impropers': getattr(args, 'impropers', False),
+        'planarity': getattr(args, 'planarity', None)
+    }
+
+
+def setup(args: argparse.Namespace) -> dict:
+    if getattr(args, 'socket', None):
+        return {'socket': args.socket, 'structure': structure_options(args)}
+
+    from just_psf.parsers.rtop import RTopParser
+    from just_psf.residue_cache import ResidueCache
+
+    library = None
+    if args.library:
+        from just_psf.geometry_analyzer import ResidueTemplates
+
+        with open(args.library) as f:
+            library = ResidueTemplates(RTopParser(f).topologies())
+
+    return {
+        'library': library,
+        'cache': ResidueCache(args.cache, max_entries=args.cache_size) if args.cache else None,
+        'memory_budget': int(args.memory_budget * 2 ** 20) if getattr(args, 'memory_budget', None) else None,
+        'structure': structure_options(args)
+    }
+
+
+def convert(context: dict, infile: TextIO, outfiles: Dict[str, TextIO]):
+    if 'socket' in context:
+        return convert_remote(context['socket'], infile, outfiles, context['structure'])
+
+    from just_psf.geometry_analyzer import GeometryAnalyzer
+
+    geometry = batch.read_geometry(infile)
+    analyzer = GeometryAnalyzer(geometry, library=context['library'], cache=context['cache'])
+
+    # "ext xplor" format required, because atom types may be longer than 4 chars!
+    if '.psf' in outfiles:
+        analyzer.structure(memory_budget=context['memory_budget'], **context['structure']).to_psf(
+            outfiles['.psf'], flags=['EXT', 'XPLOR'])
+
+    if '.pdb' in outfiles:
+        analyzer.pdb().to_pdb(outfiles['.pdb'])
+
+    if '.rtf' in outfiles:
+        analyzer.topologies().to_rtop(outfiles['.rtf'])
+
+
+def convert_remote(
+    socket_path: str, infile: TextIO, outfiles: Dict[str, TextIO], options: Optional[dict] = None
+):
+    """Same as `convert()`, but done by a server (see `just_psf.scripts.server`)"""
+
+    from just_psf.scripts.server import request
+
+    # the server might not be allowed to read the file, so send its content
+    name = getattr(infile, 'name', '')
+    req = {'content': infile.read(), 'name': os.path.basename(name) if isinstance(name, str) else ''}
+
+    req['outputs'] = list(outfiles)
+    if options:
+        req['structure'] = options
+
+    for suffix, content in request(socket_path, req).items():
+        outfiles[suffix].write(content)
 
 
 def main():
+    if sys.argv[1:2] == ['serve']:
+        from just_psf.scripts import server
+        return server.main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument('infile', type=argparse.FileType('r'), help='input geometry')
-    parser.add_argument('-o', '--output', type=argparse.FileType('w'), help='output', default=sys.stdout)
+    batch.add_arguments(parser, 'input geometry (XYZ or PDB)')
+    parser.add_argument('-l', '--library', help='residue topologies (RTF) to be used as templates')
+    parser.add_argument('-c', '--cache', help='residue cache (SQLite database), shared across runs')
+    parser.add_argument('--cache-size', type=int, default=1000, help='maximum number of residues in the cache')
+    parser.add_argument(
+        '--memory-budget',
+        type=float,
+        help='memory (in MB) for angles and dihedrals, beyond which they are stored in temporary files')
+    parser.add_argument('--hbonds', action='store_true', help='find hydrogen-bond donors and acceptors (NDON, NACC)')
+    parser.add_argument('--impropers', action='store_true', help='add impropers for atoms with three neighbors')
+    parser.add_argument(
+        '--planarity', type=float, help='only add impropers for centers that are planar within this angle (degrees)')
+    parser.add_argument('-s', '--socket', help='send the inputs to a server (started with `just-psf serve SOCKET`)')
+    parser.add_argument(
+        '--pdb', nargs='?', const='', help='also create a PDB (next to the PSF if no path is given)')
+    parser.add_argument(
+        '--rtf', nargs='?', const='', help='also create a RTF (next to the PSF if no path is given)')
 
     args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
 
-    # read file
-    geometry = Geometry.from_xyz(args.infile)
+    outputs = {'.psf': args.output}
+    for suffix, path in (('.pdb', args.pdb), ('.rtf', args.rtf)):
+        if path is None:
+            continue
 
-    # make topology
-    # "ext xplor" format required, because atom types may be longer than 4 chars!
-    GeometryAnalyzer(geometry).structure().to_psf(args.output, flags=['EXT', 'XPLOR'])
+        if path == '' and not batch.is_batch(args):
+            if args.output is None:
+                parser.error('`--{}` without a path requires `-o`'.format(suffix[1:]))
+
+            path = str(pathlib.Path(args.output).with_suffix(suffix))
+
+        outputs[suffix] = path if path != '' else None
+
+    if batch.run(parser, args, setup, convert, outputs) > 0:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,27 +1,53 @@
 """
 "Just get me a topology, for god’s sake!"
 Create a Residue Topology(ies) File (RTF), based on the distance matrix.
+If the input is a PSF, its bonds are used instead.
+If the input is a PDB, its residues are used.
 """
 
 import argparse
+import logging
 import sys
+from typing import TextIO, Dict
 
-from just_psf.geometry import Geometry
-from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.scripts import batch
+
+
+def setup(args: argparse.Namespace) -> dict:
+    from just_psf.parsers.rtop import RTopParser
+
+    library = None
+    if args.library:
+        from just_psf.geometry_analyzer import ResidueTemplates
+
+        with open(args.library) as f:
+            library = ResidueTemplates(RTopParser(f).topologies())
+
+    return {'library': library}
+
+
+def convert(context: dict, infile: TextIO, outfiles: Dict[str, TextIO]):
+    from just_psf.geometry_analyzer import GeometryAnalyzer, StructureAnalyzer
+    from just_psf.structure import Structure
+
+    if getattr(infile, 'name', '').lower().endswith('.psf'):
+        analyzer = StructureAnalyzer(Structure.from_psf(infile), library=context['library'])
+    else:
+        analyzer = GeometryAnalyzer(batch.read_geometry(infile), library=context['library'])
+
+    analyzer.topologies().to_rtop(outfiles['.rtf'])
 
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument('infile', type=argparse.FileType('r'), help='input geometry')
-    parser.add_argument('-o', '--output', type=argparse.FileType('w'), help='output', default=sys.stdout)
+    batch.add_arguments(parser, 'input geometry (XYZ or PDB), or PSF')
+    parser.add_argument('-l', '--library', help='residue topologies (RTF) to be used as templates')
 
     args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
 
-    # read file
-    geometry = Geometry.from_xyz(args.infile)
-
-    # make topology
-    GeometryAnalyzer(geometry).topologies().to_rtop(args.output)
+    if batch.run(parser, args, setup, convert, {'.rtf': args.output}) > 0:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,187 @@
+"""
+"Just get me a topology, for god’s sake!"
+Serve conversions from a warm process, on a Unix domain socket (see `just-psf serve`).
+
+Each request is a line of JSON: `{"content": ..., "name": ..., "outputs": [...]}` or `{"path": ..., "outputs": [...]}`,
+where `content` is the content of the input (and `name` its name, used to guess its format), `path` an absolute path
+to it (only accepted if the server was given a root directory with `--root`, and within it), and `outputs` a list
+of suffixes among `.psf`, `.pdb` and `.rtf`. Optionally, `structure` contains options of the PSF (`hbonds`,
+`impropers` and `planarity`, as on the command line).
+The response is also a line of JSON, `{".psf": ..., ...}` with the content of each output, or `{"error": ...}`.
+Many requests can be sent on the same connection.
+"""
+
+import argparse
+import concurrent.futures
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+from typing import Optional, List, Dict
+
+from just_psf import logger
+
+
+l_logger = logger.getChild(__name__)
+
+
+SUFFIXES = ('.psf', '.pdb', '.rtf')
+STRUCTURE_OPTIONS = ('hbonds', 'impropers', 'planarity')
+
+
+class ServerError(Exception):
+    pass
+
+
+def check_path(path: str, root: Optional[str]) -> str:
+    """Check that `path` is absolute and within `root` (if any, otherwise no path is allowed), links resolved.
+    Raise `ValueError` if not.
+    """
+
+    if root is None:
+        raise ValueError('inputs should be given by content (no root directory to read from)')
+
+    if not os.path.isabs(path):
+        raise ValueError('path should be absolute')
+
+    real_path, real_root = os.path.realpath(path), os.path.realpath(root)
+    if os.path.commonpath([real_path, real_root]) != real_root:
+        raise ValueError('path should be within `{}`'.format(root))
+
+    return real_path
+
+
+def handle_request(context: dict, request: dict, root: Optional[str] = None) -> Dict[str, str]:
+    """Process a request, with `context` as obtained from `just_psf.scripts.just_psf.setup()`, inputs given by path
+    being read only from `root` (see `check_path()`)
+    """
+
+    from just_psf.scripts.just_psf import convert
+
+    outputs = request.get('outputs', ['.psf'])
+    if len(outputs) == 0 or any(suffix not in SUFFIXES for suffix in outputs):
+        raise ValueError('outputs should be among {}'.format(', '.join(SUFFIXES)))
+
+    options = request.get('structure', {})
+    if any(name not in STRUCTURE_OPTIONS for name in options):
+        raise ValueError('structure options should be among {}'.format(', '.join(STRUCTURE_OPTIONS)))
+
+    if 'path' in request:
+        infile = open(check_path(request['path'], root))
+    elif 'content' in request:
+        infile = io.StringIO(request['content'])
+        infile.name = request.get('name', 'input.xyz')
+    else:
+        raise ValueError('request should contain either `path` or `content`')
+
+    outfiles = dict((suffix, io.StringIO()) for suffix in outputs)
+
+    with infile:
+        convert(dict(context, structure=dict(context['structure'], **options)), infile, outfiles)
+
+    return dict((suffix, f.getvalue()) for suffix, f in outfiles.items())
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Read the requests of a connection, and hand each of them to the worker threads, one at a time (so that the
+    responses are in the same order)
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.executor.submit(
+                    handle_request, self.server.context, json.loads(line), self.server.root).result()
+            except Exception as e:
+                l_logger.info('error while processing request: {}'.format(e))
+                response = {'error': '{}: {}'.format(type(e).__name__, e)}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve conversions on the Unix domain socket `path`.
+    Requests are processed by a pool of `jobs` threads, which share the same `context` (see
+    `just_psf.scripts.just_psf.setup()`), and thus the same library and residue cache. Each connection is read by its
+    own (daemon) thread, so that idle connections do not take a worker, nor prevent the server from closing.
+    Inputs can only be given by path if they are within `root` (by content otherwise).
+    """
+
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, path: str, context: dict, jobs: int = 4, root: Optional[str] = None):
+        self.context = context
+        self.root = root
+
+        if os.path.lexists(path):  # stale socket, but nothing else
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise ServerError('`{}` exists and is not a socket'.format(path))
+
+            os.remove(path)
+
+        super().__init__(path, RequestHandler)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def request(path: str, req: dict) -> Dict[str, str]:
+    """Send a request to the server listening on `path`, and get the outputs.
+    Raise `ServerError` if the server could not process it.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps(req).encode('utf-8') + b'\n')
+
+        with s.makefile('rb') as f:
+            response = json.loads(f.readline())
+
+    if 'error' in response:
+        raise ServerError(response['error'])
+
+    return response
+
+
+def main(argv: Optional[List[str]] = None):
+    from just_psf.scripts.just_psf import setup
+
+    parser = argparse.ArgumentParser(prog='just-psf serve', description=__doc__)
+    parser.add_argument('socket_path', metavar='socket', help='path to the Unix domain socket')
+    parser.add_argument('-l', '--library', help='residue topologies (RTF) to be used as templates')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='number of worker threads')
+    parser.add_argument('--cache-size', type=int, default=1000, help='maximum number of residues in the cache')
+    parser.add_argument(
+        '-r', '--root', help='directory from which inputs can be read by path (otherwise, only by content)')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    # an in-memory cache, shared by all requests
+    args.cache = ':memory:'
+    context = setup(args)
+
+    # stop as on Ctrl+C (e.g., when stopped by a workflow engine), so that the socket is removed
+    def terminate(signum, frame):
+        raise KeyboardInterrupt()
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    with Server(args.socket_path, context, jobs=args.jobs, root=args.root) as server:
+        l_logger.info('listening on `{}`'.format(args.socket_path))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -1,14 +1,46 @@
+import concurrent.futures
+import itertools
+
 import numpy
 from numpy.typing import NDArray
 
-from typing import TextIO, List, Optional
+from typing import TextIO, List, Optional, Union, Iterator, Any
+
+from just_psf import residues
+from just_psf.adjacency import Adjacency
+from just_psf.columns import Column, CategoricalColumn, as_column, as_categorical, CHUNK_SIZE
 
 
 class Structure:
     """A structure, e.g., something generally found in a PSF file.
     Sometimes referred to as "topology" as well ;)
+
+    Per-atom data are stored column-wise (see `just_psf.columns`): names are categorical (codes and categories),
+    while numbers are stored in numpy arrays. They still behave as lists.
     """
 
+    # per-atom data, with the default value used when missing (see `self.to_psf()`)
+    ATOM_COLUMNS = {
+        'seg_names': 'SYS',
+        'resi_ids': 1,
+        'resi_names': 'X',
+        'atom_names': None,
+        'atom_types': None,
+        'charges': .0,
+        'masses': .0,
+        'fixed': False,
+    }
+
+    # lists of indices
+    INDEX_ARRAYS = {
+        'bonds': 2,
+        'angles': 3,
+        'dihedrals': 4,
+        'impropers': 4,
+        'donors': 2,
+        'acceptors': 2,
+    }
+
     def __init__(
         self,
         atom_names: List[str],
@@ -59,6 +91,256 @@ class Structure:
     def __len__(self) -> int:
         return len(self.atom_names)
 
+    @property
+    def seg_names(self) -> Optional[CategoricalColumn]:
+        return self._seg_names
+
+    @seg_names.setter
+    def seg_names(self, values: Optional[List[str]]):
+        self._seg_names = as_categorical(values)
+
+    @property
+    def resi_names(self) -> Optional[CategoricalColumn]:
+        return self._resi_names
+
+    @resi_names.setter
+    def resi_names(self, values: Optional[List[str]]):
+        self._resi_names = as_categorical(values)
+
+    @property
+    def atom_names(self) -> CategoricalColumn:
+        return self._atom_names
+
+    @atom_names.setter
+    def atom_names(self, values: List[str]):
+        self._atom_names = as_categorical(values)
+
+    @property
+    def atom_types(self) -> CategoricalColumn:
+        return self._atom_types
+
+    @atom_types.setter
+    def atom_types(self, values: List[str]):
+        self._atom_types = as_categorical(values)
+
+    @property
+    def resi_ids(self) -> Optional[Column]:
+        return self._resi_ids
+
+    @resi_ids.setter
+    def resi_ids(self, values: Optional[List[int]]):
+        self._resi_ids = as_column(values, numpy.int32)
+
+    @property
+    def charges(self) -> Optional[Column]:
+        return self._charges
+
+    @charges.setter
+    def charges(self, values: Optional[List[float]]):
+        self._charges = as_column(values, numpy.float64)
+
+    @property
+    def masses(self) -> Optional[Column]:
+        return self._masses
+
+    @masses.setter
+    def masses(self, values: Optional[List[float]]):
+        self._masses = as_column(values, numpy.float64)
+
+    @property
+    def fixed(self) -> Optional[Column]:
+        return self._fixed
+
+    @fixed.setter
+    def fixed(self, values: Optional[List[bool]]):
+        self._fixed = as_column(values, bool)
+
+    @property
+    def bonds(self) -> Optional[NDArray[int]]:
+        return self._bonds
+
+    @bonds.setter
+    def bonds(self, bonds: Optional[NDArray[int]]):
+        self._bonds = bonds
+        self._adjacency = None  # invalidate
+
+    def adjacency(self) -> Adjacency:
+        """Get the (CSR) adjacency index built from `self.bonds`.
+        It is built on first use, and cached until `self.bonds` is assigned again (note that modifying the array in
+        place does not invalidate it).
+        """
+
+        if self._adjacency is None:
+            self._adjacency = Adjacency.from_bonds(len(self), self.bonds)
+
+        return self._adjacency
+
+    def neighbors(self, i: int) -> NDArray[int]:
+        """Get the atoms bonded to `i`"""
+
+        return self.adjacency().neighbors(i)
+
+    def degrees(self) -> NDArray[int]:
+        """Get the number of atoms bonded to each atom"""
+
+        return self.adjacency().degrees()
+
+    def connected_components(self) -> NDArray[int]:
+        """Get the label of the connected component (molecule) to which each atom belongs"""
+
+        return self.adjacency().connected_components()
+
+    def bonded_within(self, i: int, n: int) -> NDArray[int]:
+        """Get the atoms that are at most `n` bonds away from `i` (e.g., `n=3` for 1-2, 1-3 and 1-4 neighbors)"""
+
+        return self.adjacency().within(i, n)
+
+    def residue_starts(self) -> NDArray[int]:
+        """Get the index of the first atom of each residue (see `just_psf.residues`)"""
+
+        return residues.residue_starts(len(self), [self.seg_names, self.resi_ids, self.resi_names])
+
+    def residue_charges(self) -> NDArray[float]:
+        """Get the total charge of each residue"""
+
+        charges = numpy.asarray(self.charges) if self.charges is not None else numpy.zeros(len(self))
+        return residues.residue_sums(charges, self.residue_starts())
+
+    def residue_masses(self) -> NDArray[float]:
+        """Get the total mass of each residue"""
+
+        masses = numpy.asarray(self.masses) if self.masses is not None else numpy.zeros(len(self))
+        return residues.residue_sums(masses, self.residue_starts())
+
+    def residue_centers(self, positions: NDArray[float]) -> NDArray[float]:
+        """Get the center of mass of each residue, given the `positions` of the atoms"""
+
+        masses = numpy.asarray(self.masses) if self.masses is not None else None
+        return residues.centers_of_mass(positions, masses, self.residue_starts())
+
+    def residue_bounding_boxes(self, positions: NDArray[float]) -> NDArray[float]:
+        """Get the bounding box of each residue, given the `positions` of the atoms"""
+
+        return residues.bounding_boxes(positions, self.residue_starts())
+
+    def residue_formulas(self, symbols: Optional[List[str]] = None) -> List[str]:
+        """Get the formula of each residue, the element of each atom being given by `symbols`, or guessed from the
+        masses or types (see `just_psf.geometry_analyzer.guess_symbols()`, which raises `ValueError` if it cannot)
+        """
+
+        if symbols is None:
+            from just_psf.geometry_analyzer import guess_symbols
+            symbols = guess_symbols(self)
+
+        assert len(symbols) == len(self)
+
+        return residues.formulas(symbols, self.residue_starts())
+
+    def exclusions(self, n: int = 3) -> NDArray[int]:
+        """Get the (sorted) pairs of atoms `(i, j)`, with `i < j`, at most `n` bonds away, i.e., the nonbonded
+        exclusions (1-2, 1-3 and 1-4, by default).
+        Use `Adjacency.from_pairs()` to get them in CSR format.
+        """
+
+        pairs, _ = self.adjacency().pairs(n)
+        return pairs
+
+    def pairs_14(self) -> NDArray[int]:
+        """Get the (sorted) pairs of atoms `(i, j)`, with `i < j`, exactly 3 bonds away (1-4 pairs), i.e., the ends of
+        the dihedrals, except the ones that are closer through another path (e.g., in small rings).
+        Use `Adjacency.from_pairs()` to get them in CSR format.
+        """
+
+        pairs, distances = self.adjacency().pairs(3)
+        return pairs[distances == 3]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the per-atom data and the index arrays"""
+
+        return sum(c.nbytes for c in [
+            self.seg_names, self.resi_ids, self.resi_names, self.atom_names, self.atom_types, self.charges,
+            self.masses, self.fixed, self.bonds, self.angles, self.dihedrals, self.impropers, self.donors,
+            self.acceptors
+        ] if c is not None)
+
+    @classmethod
+    def concatenate(cls, structures: List['Structure']) -> 'Structure':
+        """Concatenate structures, in this order: the indices of each structure are shifted by the number of atoms
+        that precedes it.
+        When a column is missing in some of the structures (but not all), its default value is used for them.
+        """
+
+        assert len(structures) > 0
+
+        params = {}
+        for name, default in cls.ATOM_COLUMNS.items():
+            columns = [getattr(s, name) for s in structures]
+            if all(c is None for c in columns):
+                params[name] = None
+                continue
+
+            columns = [
+                c if c is not None else [default] * len(s) for c, s in zip(columns, structures)
+            ]
+
+            if isinstance(default, str) or default is None:
+                params[name] = CategoricalColumn.concatenate([as_categorical(c) for c in columns])
+            else:
+                params[name] = Column.concatenate([Column(c, type(default)) for c in columns])
+
+        offsets = numpy.cumsum([0] + [len(s) for s in structures[:-1]])
+        for name, n in cls.INDEX_ARRAYS.items():
+            arrays = [getattr(s, name) for s in structures]
+            # negative indices (e.g., no antecedent for an acceptor) are kept as is
+            arrays = [
+                numpy.where(a < 0, a, a + offset)
+                for a, offset in zip(arrays, offsets) if a is not None and a.shape[0] > 0
+            ]
+            params[name] = numpy.concatenate(arrays) if len(arrays) > 0 else None
+
+        return cls(**params)
+
+    def select(self, selection: Union[NDArray[bool], NDArray[int], List[int]]) -> 'Structure':
+        """Get a new structure that only contains the selected atoms (given by a mask or a list of indices, in which
+        case atoms are reordered accordingly).
+        Indices are renumbered, and the bonds, angles, etc. that involve an atom which is not selected are dropped.
+        """
+
+        selection = numpy.asarray(selection)
+        if selection.dtype == bool:
+            assert selection.shape == (len(self), )
+            selection = numpy.flatnonzero(selection)
+        else:  # e.g., an empty list is a float array
+            selection = numpy.asarray(selection, dtype=numpy.int64)
+
+        # inverse lookup table
+        is_selected = numpy.zeros(len(self), dtype=bool)
+        is_selected[selection] = True
+        new_indices = numpy.full(len(self), -1, dtype=numpy.int32)
+        new_indices[selection] = numpy.arange(len(selection))
+
+        assert numpy.count_nonzero(is_selected) == len(selection), 'duplicate indices in selection'
+
+        params = {}
+        for name in self.ATOM_COLUMNS:
+            column = getattr(self, name)
+            params[name] = column[selection] if column is not None else None
+
+        for name in self.INDEX_ARRAYS:
+            array = getattr(self, name)
+            if array is None:
+                params[name] = None
+                continue
+
+            # missing atoms (-1, e.g., acceptors without antecedent) are kept as is
+            is_missing = array < 0
+            kept = array[numpy.all(is_selected[array] | is_missing, axis=1)]
+            renumbered = numpy.where(kept < 0, -1, new_indices[kept])
+            params[name] = renumbered.astype(array.dtype) if renumbered.shape[0] > 0 else None
+
+        return Structure(**params)
+
     @classmethod
     def from_psf(cls, f: TextIO) -> 'Structure':
         """Read topology from a NAMD PSF file"""
@@ -67,23 +349,24 @@ class Structure:
         return PSFParser(f).structure()
 
     @staticmethod
-    def _write_section(f: TextIO, intformat: str, array: numpy.ndarray, title: str, n_per: int, start: int = 1):
+    def _iter_section(intformat: str, array: numpy.ndarray, title: str, n_per: int, start: int = 1) -> Iterator[str]:
         if array is None:
-            f.write(intformat.format(0) + ' !{}\n\n\n'.format(title))
+            yield intformat.format(0) + ' !{}\n\n\n'.format(title)
         else:
-            f.write(intformat.format(array.shape[0]) + ' !{}\n'.format(title))
+            yield intformat.format(array.shape[0]) + ' !{}\n'.format(title)
             fmt = ''.join([intformat] * array.shape[1])
 
-            for i in range(array.shape[0]):
-                if i != 0 and i % n_per == 0:
-                    f.write('\n')
-
-                f.write(fmt.format(*(array[i] + start)))
+            # `n_per` items per line, lines are written by chunks
+            chunk_size = n_per * (CHUNK_SIZE // n_per)
+            for begin in range(0, array.shape[0], chunk_size):
+                rows = (array[begin:begin + chunk_size] + start).tolist()
+                yield ('\n' if begin > 0 else '') + '\n'.join(
+                    ''.join(fmt.format(*row) for row in rows[k:k + n_per]) for k in range(0, len(rows), n_per))
 
-            f.write('\n\n')
+            yield '\n\n'
 
-    def to_psf(self, f: TextIO, flags: Optional[List[str]] = None, title: str = '', start: int = 1):
-        """Write a (normally correct) PSF file.
+    def iter_psf(self, flags: Optional[List[str]] = None, title: str = '', start: int = 1) -> Iterator[str]:
+        """Get a (normally correct) PSF file, by chunks (of at most `CHUNK_SIZE` lines).
         Handle the `EXT` and `XPLOR` (extended format for atom types) flags.
         Does not report `CHEQ`, but put zeros if any.
         The first id is given by `start` and follows sequentially.
@@ -111,40 +394,67 @@ class Structure:
             atomformat = '{:>8d} {:4} {:4d} {:4} {:4} {:4} {:>14.6f}{:>14.6f}{:8d}' + CHEQ_EXT
             intformat = '{:>8d}'
 
-        f.write('PSF {}\n\n'.format(' '.join(flags)))
+        header = 'PSF {}\n\n'.format(' '.join(flags))
 
         # title
         if title:
-            f.write(intformat.format(1 + title.count('\n')) + ' !NTITLE\n')
-            f.write(title)
+            header += intformat.format(1 + title.count('\n')) + ' !NTITLE\n' + title
         else:
-            f.write(intformat.format(1) + ' !NTITLE\n')
-            f.write('* Generated by `{}.Structure.to_psf()`'.format(__name__))
+            header += intformat.format(1) + ' !NTITLE\n' + '* Generated by `{}.Structure.to_psf()`'.format(__name__)
 
-        f.write('\n\n')
+        yield header + '\n\n'
 
         # atoms
-        f.write(intformat.format(len(self)) + ' !NATOM\n')
-        for i in range(len(self)):
-            f.write(atomformat.format(
-                i + start,
-                self.seg_names[i] if self.seg_names is not None else 'SYS',
-                self.resi_ids[i] if self.resi_ids is not None else 1,
-                self.resi_names[i] if self.resi_names is not None else 'X',
-                self.atom_names[i],
-                self.atom_types[i],
-                self.charges[i] if self.charges is not None else .0,
-                self.masses[i] if self.masses is not None else .0,  # TODO: output actual masses
-                self.fixed[i] if self.fixed is not None else False
-            ))
-            f.write('\n')
-
-        f.write('\n')
+        yield intformat.format(len(self)) + ' !NATOM\n'
+
+        def column_or(column: Optional[Column], default):
+            return iter(column) if column is not None else itertools.repeat(default)
+
+        atoms = zip(
+            column_or(self.seg_names, 'SYS'),
+            column_or(self.resi_ids, 1),
+            column_or(self.resi_names, 'X'),
+            self.atom_names,
+            self.atom_types,
+            column_or(self.charges, .0),
+            column_or(self.masses, .0),  # TODO: output actual masses
+            column_or(self.fixed, False),
+        )
+
+        for begin in range(0, len(self), CHUNK_SIZE):
+            yield ''.join(
+                atomformat.format(i + start, *atom) + '\n'
+                for i, atom in enumerate(itertools.islice(atoms, CHUNK_SIZE), start=begin)
+            )
+
+        yield '\n'
 
         # the rest:
-        self._write_section(f, intformat, self.bonds, 'NBOND: bonds', 4, start=start)
-        self._write_section(f, intformat, self.angles, 'NTHETA: angles', 3, start=start)
-        self._write_section(f, intformat, self.dihedrals, 'NPHI: dihedrals', 2, start=start)
-        self._write_section(f, intformat, self.impropers, 'NIMPHI: impropers', 2, start=start)
-        self._write_section(f, intformat, self.donors, 'NDON: donors', 4, start=start)
-        self._write_section(f, intformat, self.acceptors, 'NACC: acceptors', 4, start=start)
+        yield from self._iter_section(intformat, self.bonds, 'NBOND: bonds', 4, start=start)
+        yield from self._iter_section(intformat, self.angles, 'NTHETA: angles', 3, start=start)
+        yield from self._iter_section(intformat, self.dihedrals, 'NPHI: dihedrals', 2, start=start)
+        yield from self._iter_section(intformat, self.impropers, 'NIMPHI: impropers', 2, start=start)
+        yield from self._iter_section(intformat, self.donors, 'NDON: donors', 4, start=start)
+        yield from self._iter_section(intformat, self.acceptors, 'NACC: acceptors', 4, start=start)
+
+    def to_psf(self, f: TextIO, flags: Optional[List[str]] = None, title: str = '', start: int = 1):
+        """Write a (normally correct) PSF file, see `self.iter_psf()`.
+        """
+
+        for chunk in self.iter_psf(flags, title, start):
+            f.write(chunk)
+
+    async def to_psf_async(
+        self,
+        f: Any,
+        flags: Optional[List[str]] = None,
+        title: str = '',
+        start: int = 1,
+        executor: Optional[concurrent.futures.Executor] = None
+    ):
+        """Same as `self.to_psf()`, without blocking the event loop (see `just_psf.aio.write_async()`).
+        """
+
+        from just_psf.aio import write_async
+
+        await write_async(f, self.iter_psf(flags, title, start), executor=executor)
@@ -0,0 +1,301 @@
+from typing import List, Tuple, Dict, Optional, Iterable, Iterator
+
+import networkx
+import numpy
+from numpy.typing import NDArray
+
+from just_psf import logger
+from just_psf.geometry import Geometry
+from just_psf.geometry_analyzer import GeometryAnalyzer, graph_hash, find_isomorphism, neighbor_pairs, guess_symbols, \
+    covalent_radii
+from just_psf.structure import Structure
+
+
+l_logger = logger.getChild(__name__)
+
+
+# a bond that is formed (or broken, if `formed` is `False`) between `i` and `j` (`i < j`) in `frame`
+BOND_EVENT_DTYPE = numpy.dtype([('frame', numpy.int64), ('i', numpy.int32), ('j', numpy.int32), ('formed', bool)])
+
+
+class TrajectoryAnalyzer:
+    """Follow the bonds (and thus the residues) of a geometry along a trajectory (e.g., reactive MD), frame by frame
+    (see `self.update()`).
+
+    Bonds are guessed as in `GeometryAnalyzer`, but only among candidate pairs (a Verlet list), i.e., the ones within
+    `threshold` times the sum of their covalent radii plus `skin`. This list is only rebuilt when an atom has moved more
+    than half the skin since it was built.
+    Then, only the components whose bonds changed are recomputed, and matched to the residues found so far (which
+    thus keep the same index along the trajectory).
+    """
+
+    def __init__(self, geometry: Geometry, threshold: float = 1.1, skin: float = .5):
+        self.symbols = geometry.symbols
+        self.threshold = threshold
+        self.skin = skin
+
+        self.radii = covalent_radii(self.symbols)
+        self.positions = geometry.positions
+
+        self.n_frames = 0
+        self.n_rebuilds = 0
+
+        # bonds, stored as sorted keys, `i * n + j` with `i < j`
+        self.g = networkx.Graph()
+        self.g.add_nodes_from((i, {'symbol': s}) for i, s in enumerate(self.symbols))
+        self.bond_keys = numpy.zeros(0, dtype=numpy.int64)
+
+        # components, and the residue they correspond to
+        self.uniq_residues: List[networkx.Graph] = []
+        self.uniq_buckets: Dict[str, List[int]] = {}
+        self.atom_components = numpy.full(len(self.symbols), -1, dtype=numpy.int64)
+        self.components: Dict[int, List[int]] = {}
+        self.component_residues: Dict[int, int] = {}
+        self._next_component = 0
+
+        self._build_candidates(self.positions)
+        self.update(self.positions)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _build_candidates(self, positions: NDArray[float]):
+        """Build the list of candidate pairs (Verlet list)"""
+
+        from scipy.spatial import cKDTree
+
+        self.reference_positions = positions.copy()
+        self.n_rebuilds += 1
+
+        if len(self) < 2:
+            self.candidates = numpy.zeros((0, 2), dtype=numpy.int64)
+            self.cutoffs = numpy.zeros(0)
+            return
+
+        pairs = cKDTree(positions).query_pairs(
+            self.threshold * 2 * self.radii.max() + self.skin, output_type='ndarray').astype(numpy.int64)
+        pairs.sort(axis=1)
+
+        cutoffs = self.threshold * (self.radii[pairs[:, 0]] + self.radii[pairs[:, 1]])
+        distances = numpy.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+        is_candidate = distances < cutoffs + self.skin
+
+        self.candidates = pairs[is_candidate]
+        self.cutoffs = cutoffs[is_candidate]
+
+        l_logger.debug('built a list of {} candidate pairs'.format(self.candidates.shape[0]))
+
+    def update(self, positions: NDArray[float]) -> Tuple[NDArray[int], NDArray[int]]:
+        """Move to the next frame, given by `positions`.
+        Return the bonds that were formed and broken (if any) since the previous frame.
+        """
+
+        assert positions.shape == (len(self), 3)
+
+        self.positions = positions
+        self.n_frames += 1
+
+        displacements = numpy.linalg.norm(positions - self.reference_positions, axis=1)
+        if displacements.shape[0] > 0 and displacements.max() > self.skin / 2:
+            self._build_candidates(positions)
+
+        distances = numpy.linalg.norm(
+            positions[self.candidates[:, 0]] - positions[self.candidates[:, 1]], axis=1)
+        bonds = self.candidates[distances < self.cutoffs]
+        bond_keys = numpy.sort(bonds[:, 0] * len(self) + bonds[:, 1])
+
+        formed = numpy.setdiff1d(bond_keys, self.bond_keys, assume_unique=True)
+        broken = numpy.setdiff1d(self.bond_keys, bond_keys, assume_unique=True)
+
+        self.bond_keys = bond_keys
+
+        formed = numpy.stack([formed // len(self), formed % len(self)], axis=1)
+        broken = numpy.stack([broken // len(self), broken % len(self)], axis=1)
+
+        if formed.shape[0] > 0 or broken.shape[0] > 0 or self.n_frames == 1:
+            self.g.remove_edges_from(broken.tolist())
+            self.g.add_edges_from(formed.tolist())
+
+            # atoms whose component may have changed
+            if self.n_frames == 1:
+                atoms = numpy.arange(len(self))
+            else:
+                changed = numpy.unique(self.atom_components[numpy.concatenate([formed, broken]).ravel()])
+                atoms = numpy.flatnonzero(numpy.isin(self.atom_components, changed))
+
+            self._update_components(atoms)
+
+        return formed, broken
+
+    def _update_components(self, atoms: NDArray[int]):
+        """Recompute the components that contain `atoms`, and match them to the residues"""
+
+        for c in numpy.unique(self.atom_components[atoms]).tolist():
+            if c >= 0:
+                del self.components[c]
+                del self.component_residues[c]
+
+        n_new = 0
+        for indices in networkx.connected_components(self.g.subgraph(atoms.tolist())):
+            indices = sorted(indices)
+            c = self._next_component
+            self._next_component += 1
+
+            self.components[c] = indices
+            self.atom_components[indices] = c
+            self.component_residues[c] = self._match_residue(indices)
+            n_new += 1
+
+        l_logger.debug('recomputed {} component(s)'.format(n_new))
+
+    def _match_residue(self, indices: List[int]) -> int:
+        """Get the index of the residue corresponding to a component, which is added if it was not found yet"""
+
+        subgraph = self.g.subgraph(indices)
+        bucket = self.uniq_buckets.setdefault(graph_hash(subgraph), [])
+
+        for i in bucket:
+            if find_isomorphism(self.uniq_residues[i], subgraph) is not None:
+                return i
+
+        self.uniq_residues.append(networkx.Graph(subgraph))
+        bucket.append(len(self.uniq_residues) - 1)
+
+        return len(self.uniq_residues) - 1
+
+    def bonds(self) -> NDArray[int]:
+        """Get the (sorted) bonds of the current frame"""
+
+        return numpy.stack([self.bond_keys // len(self), self.bond_keys % len(self)], axis=1)
+
+    def residue_counts(self) -> Dict[int, int]:
+        """Get the number of components that correspond to each residue, in the current frame"""
+
+        counts = {}
+        for i in self.component_residues.values():
+            counts[i] = counts.get(i, 0) + 1
+
+        return counts
+
+    def analyzer(self, **kwargs: Optional[object]) -> GeometryAnalyzer:
+        """Get a (complete) analyzer for the current frame, with `**kwargs` as other parameters"""
+
+        return GeometryAnalyzer(Geometry(self.symbols, self.positions), bonds=self.bonds(), **kwargs)
+
+
+def conformer_bond_changes(
+    symbols: List[str],
+    bonds: NDArray[int],
+    frames: NDArray[float],
+    threshold: float = 1.1,
+    chunk_size: int = 256
+) -> Dict[int, Tuple[NDArray[int], NDArray[int]]]:
+    """Check that every frame (conformer) of `frames`, a (F, N, 3) array of positions, has the same bonds as the
+    reference, `bonds` (bonds are guessed as in `GeometryAnalyzer`, with `threshold`), `symbols` being the elements
+    (e.g., from `guess_symbols()` for a structure).
+    Return, for each frame where it is not the case, the bonds that were gained and lost (sorted).
+
+    Candidate pairs (that might become bonds) are the ones that are close enough in the first frame, given the maximum
+    displacement from it. The distances of the bonds and candidate pairs are then computed for `chunk_size` frames
+    at once.
+    """
+
+    from scipy.spatial import cKDTree
+
+    n = len(symbols)
+    assert frames.ndim == 3 and frames.shape[1:] == (n, 3)
+
+    radii = covalent_radii(symbols)
+
+    bonds = numpy.sort(numpy.asarray(bonds, dtype=numpy.int64).reshape(-1, 2), axis=1)
+    bonds = bonds[numpy.lexsort((bonds[:, 1], bonds[:, 0]))]
+
+    # candidates: distance in any frame is at most the one in the first frame plus twice the maximum displacement
+    max_displacement = 0.
+    for start in range(0, frames.shape[0], chunk_size):
+        max_displacement = max(
+            max_displacement, float(numpy.linalg.norm(frames[start:start + chunk_size] - frames[0], axis=2).max()))
+
+    margin = 2 * max_displacement
+
+    if n > 1:
+        pairs = cKDTree(frames[0]).query_pairs(
+            threshold * 2 * radii.max() + margin, output_type='ndarray').astype(numpy.int64)
+        pairs.sort(axis=1)
+    else:
+        pairs = numpy.zeros((0, 2), dtype=numpy.int64)
+
+    pairs = pairs[~numpy.isin(pairs[:, 0] * n + pairs[:, 1], bonds[:, 0] * n + bonds[:, 1])]
+    cutoffs = threshold * (radii[pairs[:, 0]] + radii[pairs[:, 1]])
+    is_candidate = numpy.linalg.norm(frames[0, pairs[:, 0]] - frames[0, pairs[:, 1]], axis=1) < cutoffs + margin
+
+    candidates = pairs[is_candidate]
+    candidates = candidates[numpy.lexsort((candidates[:, 1], candidates[:, 0]))]
+
+    l_logger.debug('checking {} bonds and {} candidate pairs'.format(bonds.shape[0], candidates.shape[0]))
+
+    all_pairs = numpy.concatenate([bonds, candidates])
+    all_cutoffs = threshold * (radii[all_pairs[:, 0]] + radii[all_pairs[:, 1]])
+
+    changes = {}
+    for start in range(0, frames.shape[0], chunk_size):
+        chunk = frames[start:start + chunk_size]
+        is_bonded = numpy.linalg.norm(chunk[:, all_pairs[:, 0]] - chunk[:, all_pairs[:, 1]], axis=2) < all_cutoffs
+
+        lost = ~is_bonded[:, :bonds.shape[0]]
+        gained = is_bonded[:, bonds.shape[0]:]
+
+        for f in numpy.flatnonzero(lost.any(axis=1) | gained.any(axis=1)).tolist():
+            changes[start + f] = (candidates[gained[f]], bonds[lost[f]])
+
+    return changes
+
+
+def bond_events(
+    structure: Structure,
+    frames: Iterable[NDArray[float]],
+    threshold: float = 1.1,
+    symbols: Optional[List[str]] = None
+) -> Iterator[NDArray]:
+    """Follow the bonds of `structure` (e.g., read from a PSF) along `frames`, any iterable of (N, 3) arrays of
+    positions (e.g., a `DCD`), with bonds guessed as in `GeometryAnalyzer`.
+    Yield, for each frame where bonds are formed or broken, the corresponding events (a record array of
+    `BOND_EVENT_DTYPE`, sorted by pair), with respect to the previous frame. The first frame is thus compared to the
+    bonds of the structure.
+
+    The elements are given by `symbols`, or guessed from the structure (see `guess_symbols()`).
+    Frames are processed one at a time, so that a trajectory is scanned in a single pass.
+    """
+
+    if symbols is None:
+        symbols = guess_symbols(structure)
+
+    assert len(symbols) == len(structure)
+    n = len(structure)
+
+    keys = numpy.zeros(0, dtype=numpy.int64)
+    if structure.bonds is not None and len(structure.bonds) > 0:
+        bonds = numpy.sort(numpy.asarray(structure.bonds, dtype=numpy.int64), axis=1)
+        keys = numpy.unique(bonds[:, 0] * n + bonds[:, 1])
+
+    for frame, positions in enumerate(frames):
+        pairs, _ = neighbor_pairs(positions, symbols, threshold)
+        frame_keys = pairs[:, 0] * n + pairs[:, 1]  # already sorted
+
+        formed = numpy.setdiff1d(frame_keys, keys, assume_unique=True)
+        broken = numpy.setdiff1d(keys, frame_keys, assume_unique=True)
+        keys = frame_keys
+
+        if formed.shape[0] == 0 and broken.shape[0] == 0:
+            continue
+
+        changed = numpy.concatenate([formed, broken])
+        order = numpy.argsort(changed, kind='stable')
+
+        events = numpy.empty(changed.shape[0], dtype=BOND_EVENT_DTYPE)
+        events['frame'] = frame
+        events['i'] = changed[order] // n
+        events['j'] = changed[order] % n
+        events['formed'] = order < formed.shape[0]
+
+        yield events
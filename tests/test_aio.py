@@ -0,0 +1,67 @@
+import asyncio
+import io
+import pathlib
+
+import numpy
+
+from just_psf.aio import analyze_async, write_async
+from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.structure import Structure
+
+from tests import path_from_tests_files
+
+
+class SlowWriter:
+    """Asynchronous writer, which takes its time"""
+
+    def __init__(self):
+        self.chunks = []
+
+    async def write(self, chunk: str):
+        await asyncio.sleep(.01)
+        self.chunks.append(chunk)
+
+
+def test_analyze_async_ok(geometry_7waters):
+    path = str(path_from_tests_files(pathlib.Path('tests_files/7H2O.xyz')))
+
+    async def convert():
+        analyzers = await asyncio.gather(analyze_async(path), analyze_async(geometry_7waters))
+
+        f = io.StringIO()
+        await analyzers[0].structure().to_psf_async(f)
+        return analyzers, f.getvalue()
+
+    analyzers, psf = asyncio.run(convert())
+
+    f = io.StringIO()
+    GeometryAnalyzer(geometry_7waters).structure().to_psf(f)
+
+    assert psf == f.getvalue()
+    assert analyzers[1].uniq_resi_names == analyzers[0].uniq_resi_names
+
+
+def test_write_async_cancel():
+    n = 300000
+    structure = Structure(['C'] * n, ['CT'] * n, bonds=numpy.stack([numpy.arange(n - 1), numpy.arange(1, n)], axis=1))
+
+    chunks = structure.iter_psf()
+    writer = SlowWriter()
+
+    async def write_and_cancel():
+        task = asyncio.create_task(write_async(writer, chunks))
+        await asyncio.sleep(.05)
+        task.cancel()
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+
+        return False
+
+    assert asyncio.run(write_and_cancel())
+
+    # stopped before the end, and the generator is closed
+    assert 0 < len(writer.chunks) < len(list(structure.iter_psf()))
+    assert next(chunks, None) is None
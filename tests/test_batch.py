@@ -0,0 +1,69 @@
+import argparse
+import pathlib
+
+from just_psf.scripts import batch, just_psf, just_pdb, just_rtf
+
+from tests import path_from_tests_files
+
+
+def test_expand_inputs_ok(tempdir):
+    xyz_files = sorted(str(p) for p in path_from_tests_files(pathlib.Path('tests_files')).glob('*.xyz'))
+
+    manifest = tempdir / 'manifest.txt'
+    with manifest.open('w') as f:
+        f.write('# comment\n{}\n\n{}\n'.format(xyz_files[1], xyz_files[0]))
+
+    assert batch.expand_inputs([str(pathlib.Path(xyz_files[0]).parent / '*.xyz')]) == xyz_files
+    assert batch.expand_inputs(['@{}'.format(manifest), 'x.xyz']) == [xyz_files[1], xyz_files[0], 'x.xyz']
+
+
+def test_batch_ok(tempdir):
+    inputs = [
+        str(path_from_tests_files(pathlib.Path('tests_files/{}'.format(name))))
+        for name in ['H2O.xyz', '7H2O.xyz', 'fluoroethylene.xyz']
+    ]
+
+    bad_input = tempdir / 'bad.xyz'
+    with bad_input.open('w') as f:
+        f.write('garbage\n')
+
+    parser = argparse.ArgumentParser()
+    batch.add_arguments(parser, 'input')
+    parser.add_argument('-l', '--library')
+    parser.add_argument('-c', '--cache')
+    parser.add_argument('--cache-size', type=int, default=1000)
+
+    # many inputs, in parallel
+    args = parser.parse_args(inputs + [str(bad_input), '-d', str(tempdir / 'out'), '-j', '2'])
+    assert batch.run(parser, args, just_psf.setup, just_psf.convert, {'.psf': args.output}) == 1
+    assert not (tempdir / 'out' / 'bad.psf').exists()
+
+    # outputs are the same as for a single input
+    for inp in inputs:
+        single_output = tempdir / 'single.psf'
+        args = parser.parse_args([inp, '-o', str(single_output)])
+        assert batch.run(parser, args, just_psf.setup, just_psf.convert, {'.psf': args.output}) == 0
+
+        assert (tempdir / 'out' / (pathlib.Path(inp).stem + '.psf')).read_text() == single_output.read_text()
+
+
+def test_multiple_outputs_ok(tempdir):
+    inp = str(path_from_tests_files(pathlib.Path('tests_files/7H2O.xyz')))
+
+    parser = argparse.ArgumentParser()
+    batch.add_arguments(parser, 'input')
+    parser.add_argument('-l', '--library')
+    parser.add_argument('-c', '--cache')
+    parser.add_argument('--cache-size', type=int, default=1000)
+
+    # PSF, PDB and RTF at once ...
+    args = parser.parse_args([inp, '-d', str(tempdir / 'multi')])
+    outputs = {'.psf': None, '.pdb': None, '.rtf': None}
+    assert batch.run(parser, args, just_psf.setup, just_psf.convert, outputs) == 0
+
+    # ... are the same as separately
+    for suffix, script in (('.pdb', just_pdb), ('.rtf', just_rtf)):
+        args = parser.parse_args([inp, '-o', str(tempdir / ('single' + suffix))])
+        assert batch.run(parser, args, script.setup, script.convert, {suffix: args.output}) == 0
+
+        assert (tempdir / 'multi' / ('7H2O' + suffix)).read_text() == (tempdir / ('single' + suffix)).read_text()
@@ -0,0 +1,69 @@
+import numpy
+import pytest
+
+from just_psf.dcd import DCD, DCDWriter, DCDError, write_dcd
+from just_psf.geometry_analyzer import GeometryAnalyzer
+
+
+@pytest.mark.parametrize('endian,charmm', [('<', True), ('>', True), ('<', False), ('>', False)])
+def test_dcd_write_read_ok(tempdir, endian, charmm):
+    rng = numpy.random.default_rng(0)
+    positions = rng.normal(size=(5, 7, 3))
+    cells = rng.uniform(size=(5, 6)) if charmm else None
+
+    path = tempdir / 'traj.dcd'
+    write_dcd(
+        path, positions, cells, titles=['A trajectory'], istart=10, nsavc=2, delta=.5, charmm=charmm, endian=endian)
+
+    dcd = DCD(path)
+    assert len(dcd) == 5
+    assert dcd.n_atoms == 7
+    assert dcd.endian == endian
+    assert dcd.is_charmm == charmm
+    assert dcd.titles == ['A trajectory']
+    assert (dcd.istart, dcd.nsavc, dcd.delta) == (10, 2, .5)
+
+    assert numpy.allclose(dcd.positions, positions.astype(numpy.float32))
+    assert numpy.allclose(dcd[2], positions[2].astype(numpy.float32))
+
+    if charmm:
+        assert numpy.allclose(dcd.cells, cells)
+    else:
+        assert dcd.cells is None
+
+    # views, not copies
+    assert numpy.shares_memory(dcd[0], dcd.frames)
+
+
+def test_dcd_modify_ok(tempdir, geometry_7waters):
+    path = tempdir / 'traj.dcd'
+
+    with DCDWriter(path, len(geometry_7waters)) as writer:
+        for i in range(3):
+            writer.write(geometry_7waters.positions + i)
+
+    dcd = DCD(path, mode='r+')
+    assert dcd.n_frames_header == 3
+
+    # frames can be analyzed directly
+    maker = GeometryAnalyzer(dcd.geometry(1, geometry_7waters.symbols))
+    assert len(maker.resi_isomorphic_to[0]) == 7
+
+    dcd.positions[1, 0] = [1., 2., 3.]
+    dcd.flush()
+    del dcd
+
+    assert numpy.allclose(DCD(path)[1, 0], [1., 2., 3.])
+
+
+def test_dcd_not_ok(tempdir):
+    path = tempdir / 'traj.dcd'
+
+    with open(path, 'wb') as f:
+        f.write(b'nope')
+
+    with pytest.raises(DCDError):
+        DCD(path)
+
+    with pytest.raises(DCDError):
+        DCDWriter(path, 3, has_cell=True, charmm=False)
@@ -1,6 +1,15 @@
+import concurrent.futures
+import io
+import time
+
 import numpy
 
-from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.geometry import Geometry, PDBGeometry
+from just_psf.geometry_analyzer import GeometryAnalyzer, StructureAnalyzer, BondSweep, ResidueTemplates, \
+    neighbor_pairs, residue_neighbor_pairs
+from just_psf.parsers.rtop import RTopParser, RTopIndex
+from just_psf.structure import Structure
+from just_psf.residue_topology import Topologies, ResidueTopology
 
 
 def test_guess_bonds_ok(geometry_fluoroethylene, structure_fluoroethylene):
@@ -89,3 +98,316 @@ def test_pdb_make_7waters_ok(geometry_7waters, geometry_7waters_pdb):
     assert geometry_7waters_pdb.resi_ids == auto_pdb.resi_ids
     assert geometry_7waters_pdb.symbols == auto_pdb.symbols
     assert numpy.allclose(auto_pdb.positions, geometry_7waters_pdb.positions, atol=1e-3)
+
+
+def test_match_library_7waters_ok(geometry_7waters, geometry_fluoroethylene):
+    library = Topologies(
+        masses={'HT': 1.008, 'OT': 15.9994},
+        residues=[ResidueTopology(
+            resi_name='TIP3',
+            atom_names=['H1', 'OH2', 'H2'],
+            atom_types=['HT', 'OT', 'HT'],
+            atom_charges=[.417, -.834, .417],
+            bonds=numpy.array([[1, 0], [1, 2]])
+        )]
+    )
+
+    maker = GeometryAnalyzer(geometry_7waters, library=library)
+    assert maker.uniq_resi_names == ['TIP3']
+
+    auto_structure = maker.structure()
+    assert set(auto_structure.resi_names) == {'TIP3'}
+    assert auto_structure.atom_names[:3] == ['OH2', 'H1', 'H2']
+    assert auto_structure.atom_types[:3] == ['OT', 'HT', 'HT']
+    assert auto_structure.charges[:3] == [-.834, .417, .417]
+
+    auto_topology = maker.topologies()
+    assert auto_topology.masses == library.masses
+    assert auto_topology.residues[0].atom_names == ['H1', 'OH2', 'H2']
+
+    # no match
+    maker = GeometryAnalyzer(geometry_fluoroethylene, library=library)
+    assert maker.uniq_resi_names == ['RES1']
+    assert maker.structure().atom_types == geometry_fluoroethylene.symbols
+
+
+def test_match_library_united_atoms(geometry_water):
+    # a united-atom CH2 is not a nitrogen (nor an oxygen)
+    library = Topologies(
+        masses={'CH2E': 14.027, 'HT': 1.008},
+        residues=[ResidueTopology(
+            resi_name='UA',
+            atom_names=['C1', 'H1', 'H2'],
+            atom_types=['CH2E', 'HT', 'HT'],
+            atom_charges=[.0, .0, .0],
+            bonds=numpy.array([[0, 1], [0, 2]])
+        )]
+    )
+
+    templates = ResidueTemplates(library)
+    assert templates.buckets == {}
+
+    geometry = Geometry(['N', 'H', 'H'], geometry_water.positions)
+    assert GeometryAnalyzer(geometry, library=templates).uniq_resi_names == ['RES1']
+
+
+def test_match_indexed_library_ok(tempdir, geometry_7waters):
+    path = tempdir / 'library.rtf'
+    path.write_text("""* Library
+*
+19 1
+
+MASS -1 H      1.008
+MASS -1 C     12.011
+MASS -1 O     15.999
+
+RESI ETHE  0.00
+ATOM C1   C     0.00
+ATOM C2   C     0.00
+ATOM H1   H     0.00
+ATOM H2   H     0.00
+ATOM H3   H     0.00
+ATOM H4   H     0.00
+BOND C1 C2 C1 H1 C1 H2 C2 H3 C2 H4
+
+RESI TIP3  0.00
+ATOM OH2  O     0.00
+ATOM H1   H     0.00
+ATOM H2   H     0.00
+BOND OH2 H1 OH2 H2
+
+END
+""")
+
+    index = RTopIndex.build(str(path))
+    assert index.n_atoms == {'ETHE': 6, 'TIP3': 3}
+
+    topologies = index.topologies()
+    templates = ResidueTemplates(topologies)
+    assert topologies.residues == []  # nothing parsed yet
+
+    maker = GeometryAnalyzer(geometry_7waters, library=templates)
+    assert maker.uniq_resi_names == ['TIP3']
+
+    # only the residues with as many atoms as a water are parsed
+    assert [r.resi_name for r in topologies.residues] == ['TIP3']
+
+    # concurrent matches wait for the residues being parsed
+    templates = ResidueTemplates(index.topologies())
+    del templates.pending[6]  # so that the water is the last one to be parsed
+    add = templates._add
+
+    def slow_add(resi_name: str):
+        time.sleep(.5)
+        add(resi_name)
+
+    templates._add = slow_add
+
+    water = GeometryAnalyzer(geometry_7waters).uniq_residues[0].subgraph
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(templates.match, water)
+        time.sleep(.1)  # ... which is being parsed
+        matches = [first] + [executor.submit(templates.match, water) for _ in range(3)]
+        matches = [future.result() for future in matches]
+
+    assert all(match is not None and match[0].resi_name == 'TIP3' for match in matches)
+
+
+def test_structure_analyzer_ok(structure_7water_psf, structure_fluoroethylene_psf):
+    maker = StructureAnalyzer(structure_7water_psf)
+    assert len(maker.uniq_residues) == 1
+    assert maker.resi_ids == structure_7water_psf.resi_ids
+
+    auto_topology = maker.topologies()
+    assert auto_topology.masses == {'O': 15.999, 'H': 1.008}
+    assert len(auto_topology.residues) == 1
+    assert auto_topology.residues[0].resi_name == 'RES1'
+    assert auto_topology.residues[0].atom_names == ['O1', 'H2', 'H3']
+
+    auto_structure = maker.structure()
+    assert auto_structure.atom_names == structure_7water_psf.atom_names
+    assert numpy.array_equal(auto_structure.bonds, structure_7water_psf.bonds)
+
+    # two different residues (and non-unique atom names in fluoroethylene)
+    merged = Structure.concatenate([structure_7water_psf, structure_fluoroethylene_psf])
+    maker = StructureAnalyzer(merged)
+    assert maker.uniq_resi_names == ['RES1', 'X']
+
+    auto_topology = maker.topologies()
+    assert auto_topology.masses == {'O': 15.999, 'H': 1.008, 'F_': 19.0, 'C_2': 12.01, 'H_': 1.01}
+    assert auto_topology.residues[1].atom_names == ['F22', 'C23', 'C24', 'H25', 'H26', 'H27']
+    assert auto_topology.residues[1].atom_types == ['F_', 'C_2', 'C_2', 'H_', 'H_', 'H_']
+
+    topology = RTopParser(auto_topology.as_rtop()).topologies()
+    assert numpy.array_equal(topology.residues[1].bonds, structure_fluoroethylene_psf.bonds)
+
+
+def test_pdb_residues_7waters_ok(geometry_7waters, geometry_7waters_pdb):
+    maker = GeometryAnalyzer(geometry_7waters_pdb)
+    assert maker.uniq_resi_names == ['HOH']
+    assert maker.inter_bonds == []
+
+    # same result as from scratch, but with the names of the PDB
+    auto_structure = maker.structure()
+    ref_structure = GeometryAnalyzer(geometry_7waters).structure()
+    assert numpy.array_equal(auto_structure.bonds, ref_structure.bonds)
+    assert set(min(tuple(a), tuple(a[::-1])) for a in auto_structure.angles.tolist()) == \
+        set(min(tuple(a), tuple(a[::-1])) for a in ref_structure.angles.tolist())
+
+    auto_pdb = maker.pdb()
+    assert auto_pdb.resi_names == geometry_7waters_pdb.resi_names
+    assert auto_pdb.atom_names == geometry_7waters_pdb.atom_names
+    assert auto_pdb.resi_ids == geometry_7waters_pdb.resi_ids
+
+
+def test_pdb_residues_chain_ok():
+    # a chain of 4 CH2, one per residue
+    positions = []
+    for k in range(4):
+        c = numpy.array([1.27 * k, .8 * (k % 2), 0])
+        d = .5 if k % 2 else -.5
+        positions.extend([c, c + [0, d, .9], c + [0, d, -.9]])
+
+    geometry = PDBGeometry(
+        symbols=['C', 'H', 'H'] * 4,
+        positions=numpy.array(positions),
+        resi_ids=[1] * 3 + [2] * 3 + [3] * 3 + [4] * 3,
+        resi_names=['CH2'] * 12,
+        atom_names=['C', 'H1', 'H2'] * 4
+    )
+
+    maker = GeometryAnalyzer(geometry)
+    assert len(maker.uniq_residues) == 1
+    assert maker.inter_bonds == [(0, 3), (3, 6), (6, 9)]
+
+    # angles and dihedrals between residues are there
+    auto_structure = maker.structure()
+    ref_structure = GeometryAnalyzer(Geometry(geometry.symbols, geometry.positions)).structure()
+
+    assert sorted(auto_structure.angles.tolist()) == sorted(ref_structure.angles.tolist())
+    assert sorted(auto_structure.dihedrals.tolist()) == sorted(ref_structure.dihedrals.tolist())
+
+    # ... and bonds to the next residue are declared
+    auto_topology = maker.topologies()
+    assert auto_topology.declarations == ['+C']
+    assert auto_topology.residues[0].bonds.tolist() == [[0, 1], [0, 2], [0, -1]]
+
+    # the ends of the chain have three neighbors, which depends on the bonds between residues
+    assert sorted(maker.structure(impropers=True).impropers.tolist()) == [[0, 1, 2, 3], [9, 6, 10, 11]]
+
+
+def test_residue_neighbor_pairs_ok(geometry_7waters):
+    # pack the waters, so that some are close enough to bond
+    positions = geometry_7waters.positions * .4
+    symbols = list(geometry_7waters.symbols)
+    starts = numpy.array([0, 3, 6, 12, 15, 18])  # with a residue of two waters
+
+    residue_of = numpy.repeat(numpy.arange(len(starts)), numpy.diff(numpy.append(starts, 21)))
+
+    for cell in (None, numpy.ptp(positions, axis=0) + 1.):
+        pairs, ratios = neighbor_pairs(positions, symbols, 1.1, cell)
+        is_adjacent = numpy.abs(residue_of[pairs[:, 0]] - residue_of[pairs[:, 1]]) <= 1
+        assert not numpy.all(is_adjacent)
+
+        # the same as a search over everything, without the other pairs
+        for max_window in (256, 6):  # ... including with KD-trees for the large windows
+            found, found_ratios = residue_neighbor_pairs(
+                positions, symbols, starts, 1.1, cell, max_window=max_window, chunk_size=10)
+
+            assert numpy.array_equal(found, pairs[is_adjacent])
+            assert numpy.allclose(found_ratios, ratios[is_adjacent])
+
+
+def test_structure_memory_budget_ok(geometry_7waters):
+    maker = GeometryAnalyzer(Geometry(
+        geometry_7waters.symbols * 20,
+        numpy.concatenate([geometry_7waters.positions + [20 * k, 0, 0] for k in range(20)])
+    ))
+
+    in_memory = maker.structure()
+    out_of_core = maker.structure(memory_budget=64)
+
+    assert isinstance(out_of_core.angles, numpy.memmap)
+    assert numpy.array_equal(out_of_core.angles, in_memory.angles)
+
+    f_in, f_out = io.StringIO(), io.StringIO()
+    in_memory.to_psf(f_in)
+    out_of_core.to_psf(f_out)
+    assert f_in.getvalue() == f_out.getvalue()
+
+
+def test_bond_sweep_ok(geometry_7waters):
+    sweep = BondSweep(geometry_7waters, max_threshold=2.)
+    thresholds = [2., .5, 1.1, 1.5]
+
+    n_components = sweep.n_components(thresholds)
+    assert n_components[1] == len(geometry_7waters)
+    assert n_components[2] == 7
+
+    for threshold, n in zip(thresholds, n_components):
+        maker = GeometryAnalyzer(geometry_7waters, threshold=threshold)
+        assert numpy.array_equal(sweep.bonds(threshold), numpy.array(maker.g.edges).reshape(-1, 2))
+        assert len(maker.resi_isomorphic_to) == len(sweep.analyzer(threshold).uniq_residues)
+        assert sum(len(m) for m in maker.resi_isomorphic_to.values()) == n
+
+    # analyzers are shared
+    assert sweep.analyzer(1.1) is sweep.analyzer(1.11)
+
+
+def test_structure_hbonds_ok(geometry_7waters, geometry_fluoroethylene):
+    structure = GeometryAnalyzer(geometry_7waters).structure(hbonds=True)
+
+    assert structure.donors.shape == (14, 2)
+    assert all(structure.atom_types[d] == 'O' and structure.atom_types[h] == 'H' for d, h in structure.donors.tolist())
+    assert sorted(map(tuple, structure.donors.tolist())) == sorted(map(tuple, structure.bonds.tolist()))
+
+    # no antecedent for water
+    assert structure.acceptors.tolist() == [[ai, -1] for ai in range(0, 21, 3)]
+
+    # ... which is written as 0, and read back
+    f = io.StringIO()
+    structure.to_psf(f)
+    f.seek(0)
+
+    read_structure = Structure.from_psf(f)
+    assert numpy.array_equal(read_structure.donors, structure.donors)
+    assert numpy.array_equal(read_structure.acceptors, structure.acceptors)
+
+    selected = read_structure.select([3, 4, 5])
+    assert selected.donors.tolist() == [[0, 1], [0, 2]]
+    assert selected.acceptors.tolist() == [[0, -1]]
+
+    merged = Structure.concatenate([structure, structure])
+    assert merged.acceptors.tolist() == [[ai, -1] for ai in range(0, 42, 3)]
+    assert merged.donors.tolist() == structure.donors.tolist() + (structure.donors + 21).tolist()
+
+    # the antecedent of F is C
+    structure = GeometryAnalyzer(geometry_fluoroethylene).structure(hbonds=True)
+    assert structure.donors is None
+
+    assert structure.acceptors.shape == (1, 2)
+    assert structure.acceptors[0, 0] == list(structure.atom_types).index('F')
+    assert structure.atom_types[structure.acceptors[0, 1]] == 'C'
+
+
+def test_structure_impropers_ok(geometry_7waters, geometry_fluoroethylene):
+    assert GeometryAnalyzer(geometry_7waters).structure(impropers=True).impropers is None
+
+    # the two carbons are planar centers
+    maker = GeometryAnalyzer(geometry_fluoroethylene)
+    structure = maker.structure(impropers=True)
+    assert structure.impropers.shape == (2, 4)
+    assert all(structure.atom_types[ai] == 'C' for ai in structure.impropers[:, 0].tolist())
+
+    for improper in structure.impropers.tolist():
+        assert sorted(improper[1:]) == sorted(maker.g.adj[improper[0]])
+
+    assert numpy.array_equal(maker.structure(impropers=True, planarity=5.).impropers, structure.impropers)
+
+    # ... unless they are not
+    positions = geometry_fluoroethylene.positions.copy()
+    center, a, b, neighbor = structure.impropers[0]
+    positions[neighbor] += numpy.cross(positions[a] - positions[center], positions[b] - positions[center]) * .5
+
+    maker = GeometryAnalyzer(Geometry(geometry_fluoroethylene.symbols, positions), bonds=numpy.array(maker.g.edges))
+    assert maker.structure(impropers=True, planarity=5.).impropers.tolist() == structure.impropers[1:].tolist()
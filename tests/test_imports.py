@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+import pytest
+
+
+# import time budget (in seconds) for the scripts, which should not import the heavy dependencies before they are
+# needed. It is generous, since most of it is numpy.
+IMPORT_TIME_BUDGET = .5
+
+
+def import_times(module: str) -> dict:
+    """Get the cumulative import time (in seconds) of each module imported by `module`, from `python -X importtime`
+    """
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) * 1e-6
+
+    return times
+
+
+@pytest.mark.parametrize('module', [
+    'just_psf.scripts.just_psf',
+    'just_psf.scripts.just_pdb',
+    'just_psf.scripts.just_rtf',
+    'just_psf.parsers.psf',
+    'just_psf.parsers.pdb',
+    'just_psf.parsers.rtop',
+])
+def test_import_time_ok(module):
+    times = import_times(module)
+
+    assert 'scipy' not in times
+    assert 'networkx' not in times
+    assert times[module] < IMPORT_TIME_BUDGET
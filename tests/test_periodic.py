@@ -0,0 +1,59 @@
+import numpy
+import pytest
+
+from just_psf.adjacency import Adjacency
+from just_psf.geometry import Geometry
+from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.periodic import minimum_image, unwrap, box_lengths
+
+
+def test_minimum_image_ok():
+    assert numpy.allclose(minimum_image(numpy.array([[4., -4., 1.]]), [5., 5., 5.]), [[-1., 1., 1.]])
+
+    # the same, with lattice vectors
+    lattice = numpy.array([[5., 0, 0], [0, 5., 0], [0, 0, 5.]])
+    assert numpy.allclose(minimum_image(numpy.array([4., -4., 1.]), lattice), [-1., 1., 1.])
+
+    with pytest.raises(ValueError):
+        box_lengths([[5., 1., 0], [0, 5., 0], [0, 0, 5.]])
+
+
+def test_unwrap_ok(geometry_7waters):
+    # center the waters in a box, then wrap them, so that some are split
+    box = numpy.ptp(geometry_7waters.positions, axis=0) + 2.
+    positions = geometry_7waters.positions - geometry_7waters.positions.min(axis=0) + 1. + box / 2
+    wrapped = numpy.mod(positions, box)
+
+    reference = GeometryAnalyzer(Geometry(geometry_7waters.symbols, positions))
+    assert len(GeometryAnalyzer(Geometry(geometry_7waters.symbols, wrapped)).resi_isomorphic_to[0]) < 7
+
+    maker = GeometryAnalyzer(Geometry(geometry_7waters.symbols, wrapped), cell=box)
+    assert sorted(maker.g.edges) == sorted(reference.g.edges)
+    assert len(maker.resi_isomorphic_to[0]) == 7
+
+    # unwrapped molecules are whole, up to a translation by a box vector
+    unwrapped = maker.pdb().positions
+    for k in range(0, 21, 3):
+        shift = (unwrapped[k:k + 3] - positions[k:k + 3]) / box
+        assert numpy.allclose(shift, numpy.round(shift[0]))
+
+    # directly
+    adjacency = Adjacency.from_bonds(21, numpy.array(reference.g.edges))
+    assert numpy.allclose(unwrap(wrapped, adjacency, box), unwrapped)
+
+
+def test_impropers_planarity_cell_ok(geometry_fluoroethylene):
+    positions = geometry_fluoroethylene.positions - geometry_fluoroethylene.positions.min(axis=0) + 1.
+    box = numpy.ptp(positions, axis=0) + 2.
+    box[2] = 10.
+
+    reference = GeometryAnalyzer(Geometry(geometry_fluoroethylene.symbols, positions)).structure(impropers=True)
+
+    # move an hydrogen across the box
+    hydrogen = list(geometry_fluoroethylene.symbols).index('H')
+    wrapped = positions.copy()
+    wrapped[hydrogen, 2] += box[2]
+
+    maker = GeometryAnalyzer(Geometry(geometry_fluoroethylene.symbols, wrapped), cell=box)
+    structure = maker.structure(impropers=True, planarity=5.)
+    assert structure.impropers.tolist() == reference.impropers.tolist()
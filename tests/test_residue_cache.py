@@ -0,0 +1,96 @@
+import io
+
+import numpy
+
+from just_psf.geometry import Geometry
+from just_psf.geometry_analyzer import GeometryAnalyzer, graph_hash
+from just_psf.residue_cache import ResidueCache
+
+
+def test_cache_7waters_ok(tempdir, geometry_7waters):
+    path = tempdir / 'cache.sqlite'
+
+    with ResidueCache(path) as cache:
+        maker = GeometryAnalyzer(geometry_7waters, cache=cache)
+        structure = maker.structure()
+
+        assert maker.cache_hits == 0
+        assert len(cache) == 1
+
+    # reopen: residue is found
+    with ResidueCache(path) as cache:
+        maker = GeometryAnalyzer(geometry_7waters, cache=cache)
+        structure2 = maker.structure()
+
+        assert maker.cache_hits == 1
+        assert len(cache) == 1
+
+    assert numpy.allclose(structure.angles, structure2.angles)
+
+
+def test_cache_permuted_ok(geometry_fluoroethylene):
+    cache = ResidueCache()
+
+    maker = GeometryAnalyzer(geometry_fluoroethylene, cache=cache)
+    structure = maker.structure()
+
+    # same molecule, with atoms in a different order
+    permutation = [3, 2, 5, 0, 4, 1]
+    geometry = Geometry(
+        [geometry_fluoroethylene.symbols[i] for i in permutation],
+        geometry_fluoroethylene.positions[permutation]
+    )
+
+    maker = GeometryAnalyzer(geometry, cache=cache)
+    structure2 = maker.structure()
+    assert maker.cache_hits == 1
+
+    def as_set(array, permutation=None):
+        if permutation is not None:
+            array = numpy.array(permutation)[array]
+        return set(min(tuple(x), tuple(reversed(x))) for x in array.tolist())
+
+    assert as_set(structure2.angles, permutation) == as_set(structure.angles)
+    assert as_set(structure2.dihedrals, permutation) == as_set(structure.dihedrals)
+
+
+def test_cache_eviction_ok(geometry_water, geometry_fluoroethylene):
+    cache = ResidueCache(max_entries=1)
+
+    water = GeometryAnalyzer(geometry_water, cache=cache)
+    water.structure()
+
+    fluoroethylene = GeometryAnalyzer(geometry_fluoroethylene, cache=cache)
+    fluoroethylene.structure()
+
+    # the least recently used residue was evicted
+    assert len(cache) == 1
+    assert cache.get(graph_hash(water.uniq_residues[0].subgraph)) == []
+    assert len(cache.get(graph_hash(fluoroethylene.uniq_residues[0].subgraph))) == 1
+
+
+def test_cache_warm_psf_ok(geometry_fluoroethylene):
+    # same molecule, with atoms in a different order
+    permutation = [3, 2, 5, 0, 4, 1]
+    geometry = Geometry(
+        [geometry_fluoroethylene.symbols[i] for i in permutation],
+        geometry_fluoroethylene.positions[permutation]
+    )
+
+    def psf(cache):
+        maker = GeometryAnalyzer(geometry, cache=cache)
+        f = io.StringIO()
+        maker.structure().to_psf(f)
+        return maker.cache_hits, f.getvalue()
+
+    warm_cache = ResidueCache()
+    GeometryAnalyzer(geometry_fluoroethylene, cache=warm_cache).structure()
+
+    hits, warm = psf(warm_cache)
+    assert hits == 1
+
+    hits, cold = psf(ResidueCache())
+    assert hits == 0
+
+    assert warm == cold
+    assert psf(None)[1] == cold
@@ -0,0 +1,54 @@
+import numpy
+import pytest
+
+from just_psf.geometry import PDBGeometry
+from just_psf.residues import residue_starts, residue_indices, formulas
+
+
+def test_residue_starts_ok():
+    assert residue_starts(6, [[1, 1, 2, 2, 1, 1], None, ['A'] * 6]).tolist() == [0, 2, 4]
+    assert residue_indices(6, numpy.array([0, 2, 4])).tolist() == [0, 0, 1, 1, 2, 2]
+    assert residue_starts(0, [[]]).tolist() == []
+
+
+def test_formulas_ok():
+    assert formulas(['C', 'H', 'H', 'O', 'H', 'H', 'Cl', 'C', 'H'], numpy.array([0, 3, 6])) == ['CH2', 'H2O', 'CHCl']
+    assert formulas(['Na', 'Cl', 'O', 'H', 'H'], numpy.array([0, 1, 2])) == ['Na', 'Cl', 'H2O']
+
+
+def test_structure_residues_ok(structure_7water_psf, geometry_7waters):
+    assert structure_7water_psf.residue_starts().tolist() == list(range(0, 21, 3))
+    assert numpy.allclose(structure_7water_psf.residue_charges(), 0)
+    assert numpy.allclose(structure_7water_psf.residue_masses(), 18.015, atol=1e-2)
+    assert structure_7water_psf.residue_formulas() == ['H2O'] * 7
+
+    # hydrogen mass repartitioning, with TIP3P types: only elements, or nothing
+    structure = structure_7water_psf.select(list(range(21)))
+    structure.atom_types = ['OT', 'HT', 'HT'] * 7
+    structure.masses = [15.9994 - 2 * 2.016, 3.024, 3.024] * 7
+    with pytest.raises(ValueError, match='HT, OT'):
+        structure.residue_formulas()
+
+    assert structure.residue_formulas(['O', 'H', 'H'] * 7) == ['H2O'] * 7
+
+    positions = geometry_7waters.positions
+    centers = structure_7water_psf.residue_centers(positions)
+    assert centers.shape == (7, 3)
+
+    masses = numpy.asarray(structure_7water_psf.masses)[:3]
+    assert numpy.allclose(centers[0], (positions[:3] * masses[:, numpy.newaxis]).sum(axis=0) / masses.sum())
+
+    boxes = structure_7water_psf.residue_bounding_boxes(positions)
+    assert boxes.shape == (7, 2, 3)
+    assert numpy.allclose(boxes[1], [positions[3:6].min(axis=0), positions[3:6].max(axis=0)])
+
+
+def test_pdb_residues_ok(geometry_7waters_pdb):
+    assert len(geometry_7waters_pdb.residue_starts()) == 7
+    assert geometry_7waters_pdb.residue_formulas() == ['H2O'] * 7
+    assert geometry_7waters_pdb.residue_centers().shape == (7, 3)
+    assert geometry_7waters_pdb.residue_bounding_boxes().shape == (7, 2, 3)
+
+    # without residues, everything is a single residue
+    geometry = PDBGeometry(geometry_7waters_pdb.symbols, geometry_7waters_pdb.positions)
+    assert geometry.residue_formulas() == ['H14O7']
@@ -5,7 +5,7 @@ import numpy
 import pytest
 
 
-from just_psf.parsers.rtop import RTopParser, RTopParseError
+from just_psf.parsers.rtop import RTopParser, RTopParseError, TokenType, RTopIndex
 from tests import path_from_tests_files
 
 
@@ -112,3 +112,53 @@ def test_parse_topology_ok():
 
     assert_residue_equals(topology.residues[0], topology2.residues[0])
     assert_residue_equals(topology.residues[1], topology2.residues[1])
+
+
+def test_parse_topology_stream_ok():
+    with path_from_tests_files(pathlib.Path('tests_files/topology.tpr')).open() as f:
+        content = f.read()
+
+    f = io.StringIO(content)
+    parser = RTopParser(f)
+
+    header = parser.header()
+    assert header.residues == []
+    assert header.declarations == ['-C', '+N']
+
+    residues = parser.iter_residues(header)
+    residue = next(residues)
+    assert residue.resi_name == 'ALA'
+    assert f.tell() < len(content)  # the rest of the file is not read yet
+
+    assert [r.resi_name for r in residues] == ['ARG']
+    assert parser.current_token.type == TokenType.EOF
+
+
+def test_index_topology_ok(tempdir):
+    path = path_from_tests_files(pathlib.Path('tests_files/topology.tpr'))
+    with path.open() as f:
+        topology = RTopParser(f).topologies()
+
+    index_path = tempdir / 'topology.idx'
+    index = RTopIndex.from_file(path, index_path)
+    assert index_path.exists()
+    assert list(index.residues.keys()) == ['ALA', 'ARG']
+
+    # reload
+    with index_path.open() as f:
+        index = RTopIndex.from_json(f)
+
+    assert not index.is_stale()
+
+    indexed_topology = index.topologies()
+    assert indexed_topology.masses == topology.masses
+    assert indexed_topology.declarations == topology.declarations
+    assert indexed_topology.resi_names() == ['ALA', 'ARG']
+    assert indexed_topology.residues == []
+
+    # only parse the requested residue
+    assert_residue_equals(indexed_topology.residue('ARG'), topology.residue('ARG'))
+    assert [r.resi_name for r in indexed_topology.residues] == ['ARG']
+
+    with pytest.raises(KeyError):
+        indexed_topology.residue('GLY')
@@ -0,0 +1,139 @@
+import argparse
+import concurrent.futures
+import io
+import os
+import pathlib
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from just_psf.scripts import just_psf, server
+
+from tests import path_from_tests_files
+
+
+@pytest.fixture(scope='module')
+def running_server(tempdir):
+    context = just_psf.setup(argparse.Namespace(
+        library=str(path_from_tests_files(pathlib.Path('tests_files/H2O.rtf'))), cache=':memory:', cache_size=100))
+
+    socket_path = str(tempdir / 'just-psf.sock')
+    srv = server.Server(socket_path, context, jobs=4, root=str(path_from_tests_files(pathlib.Path('tests_files'))))
+
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.start()
+
+    yield srv
+
+    srv.shutdown()
+    srv.server_close()
+    thread.join()
+
+
+def test_server_ok(running_server):
+    path = path_from_tests_files(pathlib.Path('tests_files/7H2O.xyz'))
+    context = just_psf.setup(argparse.Namespace(
+        library=str(path_from_tests_files(pathlib.Path('tests_files/H2O.rtf'))), cache=None, cache_size=0))
+
+    outfiles = dict((suffix, io.StringIO()) for suffix in server.SUFFIXES)
+    with path.open() as f:
+        just_psf.convert(context, f, outfiles)
+
+    # by path and by content, concurrently
+    requests = [{'path': str(path), 'outputs': list(server.SUFFIXES)}] * 4 + [
+        {'content': path.read_text(), 'name': '7H2O.xyz', 'outputs': list(server.SUFFIXES)}] * 4
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda r: server.request(running_server.server_address, r), requests))
+
+    for response in responses:
+        assert response == dict((suffix, f.getvalue()) for suffix, f in outfiles.items())
+
+    # the residue cache is shared between requests
+    assert len(running_server.context['cache']) == 1
+
+
+def test_server_idle_connections(running_server):
+    # more idle connections than workers
+    idle = [socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) for _ in range(8)]
+    for s in idle:
+        s.connect(running_server.server_address)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                server.request, running_server.server_address, {'content': 'garbage\n', 'outputs': ['.psf']})
+
+            with pytest.raises(server.ServerError):
+                future.result(timeout=10)
+    finally:
+        for s in idle:
+            s.close()
+
+
+def test_server_error(running_server):
+    with pytest.raises(server.ServerError):
+        server.request(running_server.server_address, {'content': 'garbage\n', 'outputs': ['.psf']})
+
+    with pytest.raises(server.ServerError):
+        server.request(running_server.server_address, {'path': '/nonexistent.xyz', 'outputs': ['.psf']})
+
+    with pytest.raises(server.ServerError):
+        server.request(running_server.server_address, {'content': '', 'outputs': ['.xyz']})
+
+    # only absolute paths, within the root
+    with pytest.raises(server.ServerError, match='absolute'):
+        server.request(running_server.server_address, {'path': 'tests_files/7H2O.xyz', 'outputs': ['.psf']})
+
+    with pytest.raises(server.ServerError, match='within'):
+        server.request(running_server.server_address, {'path': '/etc/passwd', 'outputs': ['.psf']})
+
+    outside = path_from_tests_files(pathlib.Path('tests_files/../../README.md'))
+    with pytest.raises(server.ServerError, match='within'):
+        server.request(running_server.server_address, {'path': str(outside), 'outputs': ['.psf']})
+
+
+def test_check_path(tempdir):
+    with pytest.raises(ValueError, match='content'):
+        server.check_path(str(tempdir / 'input.xyz'), None)
+
+    link = tempdir / 'link.xyz'
+    link.symlink_to('/etc/passwd')
+    with pytest.raises(ValueError, match='within'):
+        server.check_path(str(link), str(tempdir))
+
+    assert server.check_path(str(tempdir / 'a' / '..' / 'input.xyz'), str(tempdir)) == \
+        os.path.realpath(str(tempdir / 'input.xyz'))
+
+
+def test_server_not_a_socket(tempdir):
+    path = tempdir / 'not-a-socket.txt'
+    path.write_text('content')
+
+    with pytest.raises(server.ServerError, match='not a socket'):
+        server.Server(str(path), {}, jobs=1)
+
+    assert path.read_text() == 'content'
+
+
+def test_server_sigterm(tempdir):
+    socket_path = tempdir / 'sigterm.sock'
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'import sys; from just_psf.scripts import server; server.main(sys.argv[1:])',
+         str(socket_path)])
+
+    for _ in range(100):
+        if socket_path.exists():
+            break
+        time.sleep(.1)
+
+    assert socket_path.exists()
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=10) == 0
+    assert not socket_path.exists()
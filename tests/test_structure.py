@@ -1,6 +1,7 @@
 import numpy
 from io import StringIO
 
+from just_psf.adjacency import Adjacency
 from just_psf.structure import Structure
 
 
@@ -82,3 +83,143 @@ def test_structure_water_write_psf_ok(structure_water):
     assert numpy.allclose(structure_water.angles, new_structure.angles)
     assert numpy.allclose(structure_water.donors, new_structure.donors)
     assert numpy.allclose(structure_water.acceptors, new_structure.acceptors)
+
+
+def test_structure_columns_ok(structure_7water_psf):
+    # columns behave as lists
+    assert structure_7water_psf.resi_names == ['RES1'] * 21
+    assert list(structure_7water_psf.atom_names[:3]) == ['O1', 'H2', 'H3']
+    assert structure_7water_psf.resi_ids[3] == 2
+    assert set(structure_7water_psf.resi_names) == {'RES1'}
+
+    # ... but are stored as arrays
+    assert structure_7water_psf.atom_names.categories == ['O1', 'H2', 'H3']
+    assert structure_7water_psf.atom_names.codes.dtype == numpy.int32
+    assert numpy.asarray(structure_7water_psf.masses).dtype == numpy.float64
+
+    # assignment converts to columns
+    structure = Structure(['O', 'H', 'H'], ['OT', 'HT', 'HT'], resi_names=['HOH'] * 3)
+    structure.atom_names[0] = 'OH2'
+    assert structure.atom_names == ['OH2', 'H', 'H']
+
+    structure.resi_names = ['TIP3'] * 3
+    assert structure.resi_names.categories == ['TIP3']
+
+    # slices are copies
+    names = structure_7water_psf.atom_names
+    part = names[:3]
+    part[0] = 'NEWNAME'
+    assert list(names[:3]) == ['O1', 'H2', 'H3']
+    assert list(part) == ['NEWNAME', 'H2', 'H3']
+    assert len(list(names)) == 21
+
+    charges = structure_7water_psf.charges
+    part = charges[:3]
+    part[0] = 1.
+    assert charges[0] != 1.
+
+
+def test_structure_memory_ok():
+    N = 100000
+
+    structure = Structure(
+        atom_names=['OH2', 'H1', 'H2'] * (N // 4) + ['C'] * (N - 3 * (N // 4)),
+        atom_types=['OT', 'HT', 'HT'] * (N // 4) + ['CT'] * (N - 3 * (N // 4)),
+        seg_names=['SYS'] * N,
+        resi_ids=numpy.arange(N) // 3,
+        resi_names=['TIP3'] * N,
+        charges=numpy.zeros(N),
+        masses=numpy.ones(N),
+        fixed=numpy.zeros(N, dtype=bool)
+    )
+
+    assert structure.nbytes / N < 40
+
+
+def test_structure_select_ok(structure_7water_psf):
+    # select the 2nd and 3rd water
+    selected = structure_7water_psf.select(numpy.arange(3, 9))
+
+    assert len(selected) == 6
+    assert selected.resi_ids == [2, 2, 2, 3, 3, 3]
+    assert selected.atom_names == structure_7water_psf.atom_names[:6]
+    assert numpy.array_equal(selected.bonds, structure_7water_psf.bonds[2:6] - 3)
+    assert numpy.array_equal(selected.angles, structure_7water_psf.angles[1:3] - 3)
+
+    # remove the last hydrogen of each water, with a mask
+    mask = numpy.ones(len(structure_7water_psf), dtype=bool)
+    mask[2::3] = False
+    selected = structure_7water_psf.select(mask)
+
+    assert len(selected) == 14
+    assert numpy.array_equal(selected.bonds, numpy.array([[0, 1], [2, 3], [4, 5], [6, 7], [8, 9], [10, 11], [12, 13]]))
+    assert selected.angles is None
+
+    # nothing
+    for selection in ([], numpy.zeros(len(structure_7water_psf), dtype=bool)):
+        selected = structure_7water_psf.select(selection)
+        assert len(selected) == 0
+        assert list(selected.atom_names) == []
+        assert selected.bonds is None
+
+
+def test_structure_concatenate_ok(structure_7water_psf, structure_fluoroethylene):
+    first = structure_7water_psf.select(numpy.arange(0, 9))
+    last = structure_7water_psf.select(numpy.arange(9, 21))
+
+    merged = Structure.concatenate([first, last])
+    assert merged.atom_names == structure_7water_psf.atom_names
+    assert merged.resi_ids == structure_7water_psf.resi_ids
+    assert merged.masses == structure_7water_psf.masses
+    assert numpy.array_equal(merged.bonds, structure_7water_psf.bonds)
+    assert numpy.array_equal(merged.angles, structure_7water_psf.angles)
+    assert merged.dihedrals is None
+
+    # missing columns are filled with default values
+    merged = Structure.concatenate([structure_fluoroethylene, first])
+    assert len(merged) == 6 + 9
+    assert merged.atom_types == list(structure_fluoroethylene.atom_types) + list(first.atom_types)
+    assert merged.resi_names == ['X'] * 6 + ['RES1'] * 9
+    assert merged.charges == [.0] * 15
+    assert numpy.array_equal(merged.bonds[5:], first.bonds + 6)
+    assert numpy.array_equal(merged.impropers, structure_fluoroethylene.impropers)
+
+
+def test_structure_adjacency_ok(structure_fluoroethylene, structure_7water_psf):
+    # F1-C2(-H4)=C3(-H5)-H6
+    assert list(structure_fluoroethylene.neighbors(1)) == [0, 2, 3]
+    assert list(structure_fluoroethylene.degrees()) == [1, 3, 3, 1, 1, 1]
+    assert list(structure_fluoroethylene.bonded_within(0, 1)) == [1]
+    assert list(structure_fluoroethylene.bonded_within(0, 2)) == [1, 2, 3]
+    assert list(structure_fluoroethylene.bonded_within(0, 3)) == [1, 2, 3, 4, 5]
+
+    assert list(structure_7water_psf.connected_components()) == [i // 3 for i in range(21)]
+
+    # assigning bonds invalidates the index
+    structure = structure_7water_psf.select(numpy.arange(6))
+    assert list(structure.connected_components()) == [0, 0, 0, 1, 1, 1]
+    structure.bonds = numpy.vstack([structure.bonds, [[2, 3]]])
+    assert list(structure.connected_components()) == [0] * 6
+    assert list(structure.neighbors(3)) == [2, 4, 5]
+
+
+def test_structure_exclusions_ok(structure_fluoroethylene, structure_7water_psf):
+    # F1-C2(-H4)=C3(-H5)-H6
+    assert structure_fluoroethylene.exclusions(1).tolist() == sorted(
+        sorted(bond) for bond in structure_fluoroethylene.bonds.tolist())
+    assert len(structure_fluoroethylene.exclusions()) == 15  # all pairs are within 3 bonds
+    assert structure_fluoroethylene.pairs_14().tolist() == [[0, 4], [0, 5], [3, 4], [3, 5]]
+
+    # 1-4 pairs are the ends of dihedrals
+    assert structure_fluoroethylene.pairs_14().tolist() == sorted(
+        sorted([d[0], d[3]]) for d in structure_fluoroethylene.dihedrals.tolist())
+
+    # in CSR format
+    csr = Adjacency.from_pairs(len(structure_fluoroethylene), structure_fluoroethylene.pairs_14())
+    assert list(csr.neighbors(0)) == [4, 5]
+    assert list(csr.neighbors(4)) == []
+
+    exclusions = structure_7water_psf.exclusions()
+    assert exclusions.shape == (21, 2)
+    assert numpy.all(exclusions[:, 0] // 3 == exclusions[:, 1] // 3)
+    assert structure_7water_psf.pairs_14().shape == (0, 2)
@@ -0,0 +1,109 @@
+import numpy
+import pytest
+
+from just_psf.geometry_analyzer import GeometryAnalyzer
+from just_psf.trajectory_analyzer import TrajectoryAnalyzer, conformer_bond_changes, bond_events, BOND_EVENT_DTYPE
+
+
+def test_trajectory_analyzer_ok(geometry_7waters):
+    analyzer = TrajectoryAnalyzer(geometry_7waters, skin=.5)
+    maker = GeometryAnalyzer(geometry_7waters)
+
+    assert numpy.array_equal(analyzer.bonds(), numpy.array(maker.g.edges).reshape(-1, 2))
+    assert analyzer.residue_counts() == {0: 7}
+    assert analyzer.n_rebuilds == 1
+
+    # small displacement: nothing changes, and the list is not rebuilt
+    positions = geometry_7waters.positions + .05
+    formed, broken = analyzer.update(positions)
+    assert formed.shape == broken.shape == (0, 2)
+    assert analyzer.n_rebuilds == 1
+
+    # take an hydrogen away from the first water: the bond breaks
+    positions = positions.copy()
+    o, h = analyzer.components[0][:2]
+    positions[h] += 5
+    formed, broken = analyzer.update(positions)
+
+    assert analyzer.n_rebuilds == 2
+    assert broken.tolist() == [[o, h]]
+    assert formed.shape == (0, 2)
+
+    counts = analyzer.residue_counts()
+    assert counts[0] == 6  # untouched waters keep their residue
+    assert sorted(counts.values()) == [1, 1, 6]
+
+    new_maker = analyzer.analyzer()
+    assert numpy.array_equal(analyzer.bonds(), numpy.array(new_maker.g.edges).reshape(-1, 2))
+    assert len(new_maker.uniq_residues) == 3
+
+    # ... and back
+    formed, broken = analyzer.update(geometry_7waters.positions)
+    assert formed.tolist() == [[o, h]]
+    assert analyzer.residue_counts() == {0: 7}
+
+
+def test_conformer_bond_changes_ok(geometry_7waters):
+    bonds = numpy.array(GeometryAnalyzer(geometry_7waters).g.edges)
+    o, h1 = 0, 1
+
+    frames = numpy.repeat(geometry_7waters.positions[numpy.newaxis], 5, axis=0)
+    frames[1] += .01
+
+    # frame 2: hydrogen moves away, frame 4: hydrogen moves to the oxygen of another water
+    frames[2, h1] += 5
+    other_o = bonds[bonds[:, 0] != o][0, 0]
+    frames[4, h1] = frames[4, other_o] + [.0, .0, .95]
+
+    changes = conformer_bond_changes(geometry_7waters.symbols, bonds, frames, chunk_size=2)
+    assert changes.keys() == {2, 4}
+
+    gained, lost = changes[2]
+    assert gained.shape == (0, 2)
+    assert lost.tolist() == [[o, h1]]
+
+    gained, lost = changes[4]
+    assert sorted(gained.ravel().tolist()) == sorted([h1, other_o])
+    assert lost.tolist() == [[o, h1]]
+
+
+def test_bond_events_ok(structure_7water_psf, geometry_7waters):
+    frames = numpy.repeat(geometry_7waters.positions[numpy.newaxis], 4, axis=0)
+
+    # frame 1: an hydrogen leaves, frame 3: it comes back
+    frames[1:3, 1] += 5
+
+    events = list(bond_events(structure_7water_psf, iter(frames)))
+    assert len(events) == 2
+
+    assert events[0].dtype == BOND_EVENT_DTYPE
+    assert events[0].tolist() == [(1, 0, 1, False)]
+    assert events[1].tolist() == [(3, 0, 1, True)]
+
+    # with respect to the topology
+    structure = structure_7water_psf.select(list(range(len(structure_7water_psf))))
+    structure.bonds = structure.bonds[1:]
+    first_bond = sorted(structure_7water_psf.bonds[0].tolist())
+
+    events = numpy.concatenate(list(bond_events(structure, frames[:1])))
+    assert events.tolist() == [(0, *first_bond, True)]
+
+
+def test_bond_events_non_elemental_types(structure_7water_psf, geometry_7waters):
+    # TIP3P types, and hydrogen mass repartitioning: neither masses nor types are elements
+    structure = structure_7water_psf.select(list(range(len(structure_7water_psf))))
+    symbols = list(geometry_7waters.symbols)
+    structure.atom_types = ['OT' if s == 'O' else 'HT' for s in symbols]
+    structure.masses = [15.9994 - 2 * 2.016 if s == 'O' else 3.024 for s in symbols]
+
+    frames = numpy.repeat(geometry_7waters.positions[numpy.newaxis], 2, axis=0)
+    frames[1, 1] += 5
+
+    with pytest.raises(ValueError, match='HT, OT'):
+        list(bond_events(structure, iter(frames)))
+
+    events = list(bond_events(structure, iter(frames), symbols=symbols))
+    assert [e.tolist() for e in events] == [[(1, 0, 1, False)]]
+
+    with pytest.raises(ValueError, match='HT'):
+        conformer_bond_changes(list(structure.atom_types), structure.bonds, frames)